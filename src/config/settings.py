@@ -2,10 +2,20 @@
 Configurações da aplicação WhatsApp Expense Tracker.
 """
 import os
+import tempfile
+from enum import IntEnum
+from functools import lru_cache
 from dotenv import load_dotenv
 
+
+@lru_cache(maxsize=1)
+def load_environment() -> bool:
+    """Carrega as variáveis do arquivo .env uma única vez por processo."""
+    return load_dotenv()
+
+
 # Carrega variáveis de ambiente do arquivo .env
-load_dotenv()
+load_environment()
 
 class Config:
     """Configurações base da aplicação."""
@@ -17,12 +27,37 @@ class Config:
     # Database
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Cache de instruções compiladas maior que o padrão (500): as consultas dos
+    # relatórios variam por período/categoria e são reutilizadas entre usuários
+    SQLALCHEMY_ENGINE_OPTIONS = {'query_cache_size': 1200}
+    
+    # Diretório dos gráficos já renderizados
+    CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'wet-chart-cache'))
+    
+    # Cache (Flask-Caching). SimpleCache é por processo: com vários workers do
+    # gunicorn use um backend compartilhado (FileSystemCache ou RedisCache)
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'SimpleCache')
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', '60'))
+    CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'wet-cache'))
+    CACHE_THRESHOLD = int(os.getenv('CACHE_THRESHOLD', '5000'))
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
     
     # WhatsApp API
     WHATSAPP_API_URL = os.getenv('WHATSAPP_API_URL', 'https://graph.facebook.com/v21.0')
     WHATSAPP_ACCESS_TOKEN = os.getenv('WHATSAPP_ACCESS_TOKEN')
     WHATSAPP_PHONE_NUMBER_ID = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
     WHATSAPP_WEBHOOK_VERIFY_TOKEN = os.getenv('WHATSAPP_WEBHOOK_VERIFY_TOKEN')
+    # Limite total de envios por segundo (abaixo do teto de ~80 msg/s da Meta).
+    # Cada processo tem o próprio limitador, então o valor é dividido entre os
+    # processos do gunicorn (WEB_CONCURRENCY, a mesma variável que o gunicorn lê)
+    WHATSAPP_SEND_RATE = float(os.getenv('WHATSAPP_SEND_RATE', '70'))
+    WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+    WHATSAPP_SEND_RATE_PER_PROCESS = WHATSAPP_SEND_RATE / WEB_CONCURRENCY
+    # Threads que processam as mensagens do webhook fora da requisição
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+    # Espera máxima, no encerramento, pelas mensagens ainda na fila (abaixo do
+    # graceful timeout de 30s do gunicorn)
+    WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', '20'))
     
     # Application
     APP_NAME = os.getenv('APP_NAME', 'WhatsApp Expense Tracker')
@@ -30,6 +65,10 @@ class Config:
     
     # NLP
     SPACY_MODEL = 'pt_core_news_sm'
+    # Só usamos POS e lema dos tokens; parser e NER não são carregados
+    SPACY_EXCLUDE = ['parser', 'ner']
+    # Modo rápido: categoria só por palavras-chave, sem carregar o spaCy
+    NLP_FAST_MODE = os.getenv('NLP_FAST_MODE', 'False').lower() == 'true'
     
     # Categorias de gastos padrão
     DEFAULT_CATEGORIES = [
@@ -43,6 +82,46 @@ class Config:
         'roupas',
         'outros'
     ]
+    
+    # Configurações obrigatórias, verificadas por validate()
+    REQUIRED_SETTINGS = ()
+    
+    @classmethod
+    def validate(cls) -> None:
+        """
+        Verifica, de uma só vez, se as configurações obrigatórias estão definidas.
+        
+        Raises:
+            ValueError: Se alguma configuração obrigatória estiver ausente ou
+                a taxa de envio não for positiva
+        """
+        missing = [name for name in cls.REQUIRED_SETTINGS if not getattr(cls, name)]
+        if missing:
+            raise ValueError(f"Configurações obrigatórias ausentes: {', '.join(missing)}")
+        
+        if cls.WHATSAPP_SEND_RATE <= 0:
+            raise ValueError(f"WHATSAPP_SEND_RATE deve ser positivo: {cls.WHATSAPP_SEND_RATE}")
+
+class CategoryId(IntEnum):
+    """Identificadores internos das categorias padrão, em ordem de prioridade."""
+    ALIMENTACAO = 1
+    TRANSPORTE = 2
+    COMBUSTIVEL = 3
+    SAUDE = 4
+    EDUCACAO = 5
+    LAZER = 6
+    CASA = 7
+    ROUPAS = 8
+    OUTROS = 9
+    
+    @property
+    def label(self) -> str:
+        """Nome da categoria usado na apresentação e no banco."""
+        return CATEGORY_LABELS[self]
+
+# Nomes das categorias indexados pelo id (a posição 0 não é usada)
+CATEGORY_LABELS = (None, *Config.DEFAULT_CATEGORIES)
+CATEGORY_IDS = {label: CategoryId(index) for index, label in enumerate(CATEGORY_LABELS) if label}
 
 class DevelopmentConfig(Config):
     """Configurações para ambiente de desenvolvimento."""
@@ -52,9 +131,17 @@ class ProductionConfig(Config):
     """Configurações para ambiente de produção."""
     DEBUG = False
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY')
+    NLP_FAST_MODE = os.getenv('NLP_FAST_MODE', 'True').lower() == 'true'
+    # Compartilhado entre os processos do gunicorn: a invalidação feita por um
+    # worker vale para todos (o SimpleCache ficaria desatualizado nos demais)
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'FileSystemCache')
     
-    if not SECRET_KEY:
-        raise ValueError("FLASK_SECRET_KEY deve ser definida em produção")
+    REQUIRED_SETTINGS = (
+        'SECRET_KEY',
+        'WHATSAPP_ACCESS_TOKEN',
+        'WHATSAPP_PHONE_NUMBER_ID',
+        'WHATSAPP_WEBHOOK_VERIFY_TOKEN',
+    )
 
 class TestingConfig(Config):
     """Configurações para testes."""
@@ -69,3 +156,15 @@ config = {
     'default': DevelopmentConfig
 }
 
+def get_config(env: str = None) -> type:
+    """
+    Retorna a classe de configuração do ambiente.
+    
+    Args:
+        env (str, optional): Nome do ambiente (padrão: variável FLASK_ENV)
+        
+    Returns:
+        type: Classe de configuração
+    """
+    env = env or os.getenv('FLASK_ENV', 'default')
+    return config.get(env, config['default'])
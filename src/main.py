@@ -11,14 +11,25 @@ from src.routes.user import user_bp
 from src.routes.reports import reports_bp
 from src.whatsapp.webhook import webhook_bp
 from src.services.expense_service import CategoryService
-from src.config.settings import Config
+from src.services.cache import cache
+from src.config.settings import Config, get_config
+from src.utils.json_provider import OrjsonProvider
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+app.json = OrjsonProvider(app)
 
-# Configurações
-app.config['SECRET_KEY'] = Config.SECRET_KEY
+# Configurações (falha cedo se faltar alguma obrigatória no ambiente)
+app_config = get_config()
+app_config.validate()
+app.config['SECRET_KEY'] = app_config.SECRET_KEY
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = app_config.SQLALCHEMY_ENGINE_OPTIONS
+app.config['CACHE_TYPE'] = app_config.CACHE_TYPE
+app.config['CACHE_DEFAULT_TIMEOUT'] = app_config.CACHE_DEFAULT_TIMEOUT
+app.config['CACHE_DIR'] = app_config.CACHE_DIR
+app.config['CACHE_THRESHOLD'] = app_config.CACHE_THRESHOLD
+app.config['CACHE_REDIS_URL'] = app_config.CACHE_REDIS_URL
 
 # Habilita CORS
 CORS(app)
@@ -28,8 +39,9 @@ app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(reports_bp, url_prefix='/api')
 app.register_blueprint(webhook_bp, url_prefix='/api')
 
-# Inicializa banco de dados
+# Inicializa banco de dados e cache
 db.init_app(app)
+cache.init_app(app)
 with app.app_context():
     db.create_all()
     # Inicializa categorias padrão
@@ -4,13 +4,27 @@ Modelo de dados para gastos.
 from datetime import datetime
 from src.models.user import db
 
+def _with_iso_dates(fields):
+    """Converte as datas dos campos de __json__ para texto ISO 8601 (usado por to_dict)."""
+    return {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in fields.items()}
+
 class Expense(db.Model):
     """Modelo para representar um gasto."""
     
     __tablename__ = 'expenses'
+    __table_args__ = (
+        # Relatórios filtram por usuário e intervalo de datas (e às vezes categoria);
+        # category e amount no fim tornam os índices cobrindo para os agregados
+        # (e updated_at para a impressão digital dos dados); id logo após
+        # created_at entrega a ordem (created_at, id) sem ordenação extra
+        db.Index('ix_expenses_user_created', 'user_phone', 'created_at', 'id', 'category', 'amount',
+                 'updated_at'),
+        db.Index('ix_expenses_user_cat_created', 'user_phone', 'category', 'created_at', 'id', 'amount'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_phone = db.Column(db.String(20), nullable=False, index=True)
+    user_phone = db.Column(db.String(20), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     category = db.Column(db.String(50), nullable=False, index=True)
     description = db.Column(db.Text)
@@ -22,8 +36,8 @@ class Expense(db.Model):
     def __repr__(self):
         return f'<Expense {self.id}: R${self.amount} - {self.category}>'
     
-    def to_dict(self):
-        """Converte o objeto para dicionário."""
+    def __json__(self):
+        """Campos para serialização JSON (datas ficam a cargo do provider)."""
         return {
             'id': self.id,
             'user_phone': self.user_phone,
@@ -32,10 +46,14 @@ class Expense(db.Model):
             'description': self.description,
             'confidence': self.confidence,
             'original_message': self.original_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
+    def to_dict(self):
+        """Converte o objeto para dicionário (datas em ISO 8601)."""
+        return _with_iso_dates(self.__json__())
+    
     @classmethod
     def create_from_message_data(cls, user_phone: str, message_data: dict):
         """
@@ -48,14 +66,28 @@ class Expense(db.Model):
         Returns:
             Expense: Nova instância de gasto
         """
-        return cls(
-            user_phone=user_phone,
-            amount=message_data.get('amount', 0.0),
-            category=message_data.get('category', 'outros'),
-            description=message_data.get('description', ''),
-            confidence=message_data.get('confidence', 1.0),
-            original_message=message_data.get('original_message', '')
-        )
+        return cls(**cls.values_from_message_data(user_phone, message_data))
+    
+    @staticmethod
+    def values_from_message_data(user_phone: str, message_data: dict) -> dict:
+        """
+        Converte os dados processados da mensagem nos valores das colunas.
+        
+        Args:
+            user_phone (str): Telefone do usuário
+            message_data (dict): Dados processados da mensagem
+            
+        Returns:
+            dict: Valores das colunas do gasto
+        """
+        return {
+            'user_phone': user_phone,
+            'amount': message_data.get('amount', 0.0),
+            'category': message_data.get('category', 'outros'),
+            'description': message_data.get('description', ''),
+            'confidence': message_data.get('confidence', 1.0),
+            'original_message': message_data.get('original_message', '')
+        }
 
 class Category(db.Model):
     """Modelo para categorias de gastos."""
@@ -72,16 +104,20 @@ class Category(db.Model):
     def __repr__(self):
         return f'<Category {self.name}>'
     
-    def to_dict(self):
-        """Converte o objeto para dicionário."""
+    def __json__(self):
+        """Campos para serialização JSON (datas ficam a cargo do provider)."""
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'emoji': self.emoji,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário (datas em ISO 8601)."""
+        return _with_iso_dates(self.__json__())
 
 class UserSettings(db.Model):
     """Modelo para configurações do usuário."""
@@ -100,8 +136,8 @@ class UserSettings(db.Model):
     def __repr__(self):
         return f'<UserSettings {self.user_phone}>'
     
-    def to_dict(self):
-        """Converte o objeto para dicionário."""
+    def __json__(self):
+        """Campos para serialização JSON (datas ficam a cargo do provider)."""
         return {
             'id': self.id,
             'user_phone': self.user_phone,
@@ -109,7 +145,11 @@ class UserSettings(db.Model):
             'currency_format': self.currency_format,
             'timezone': self.timezone,
             'notifications_enabled': self.notifications_enabled,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário (datas em ISO 8601)."""
+        return _with_iso_dates(self.__json__())
 
@@ -10,9 +10,12 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
-    def to_dict(self):
+    def __json__(self):
         return {
             'id': self.id,
             'username': self.username,
             'email': self.email
         }
+
+    def to_dict(self):
+        return self.__json__()
@@ -2,62 +2,144 @@
 Processador de mensagens para extrair informações de gastos.
 """
 import re
-import spacy
+import threading
+from bisect import bisect_right
+from itertools import accumulate
+import ahocorasick
+from functools import lru_cache
 from typing import Dict, Optional, List, Tuple
 from datetime import datetime
-from src.config.settings import Config
+from src.config.settings import Config, CategoryId, CATEGORY_IDS, get_config
+
+# Padrão único para valores monetários:
+# R$ 50.00 / R$50 (v1), 50 reais / 50 pila / 50 prata (v2), 50.00 / 50 (v3)
+_MONEY_RE = re.compile(
+    r'(?:R\$\s*(?P<v1>\d+(?:[.,]\d{2})?))'
+    r'|(?P<v2>\d+)\s*(?:reais?|pila|pratas?)'
+    r'|(?P<v3>\d+(?:[.,]\d{2})?)',
+    re.IGNORECASE
+)
+
+# Separador das mensagens em extract_amounts: não é dígito nem espaço,
+# então nenhum valor casado pelo padrão cruza de uma mensagem para outra
+_BATCH_SEPARATOR = '\x00'
+
+# Palavras-chave para identificar gastos
+EXPENSE_KEYWORDS = (
+    'gastei', 'gasto', 'paguei', 'comprei', 'saiu', 'custou',
+    'despesa', 'débito', 'conta', 'fatura', 'pagamento'
+)
+
+# Palavras-chave para relatórios
+REPORT_KEYWORDS = (
+    'relatório', 'relatorio', 'resumo', 'total', 'quanto gastei',
+    'balanço', 'balanco', 'extrato', 'histórico', 'historico'
+)
+
+# Mapeamento de categorias e suas variações
+CATEGORY_MAPPING = {
+    'alimentação': ['alimentação', 'alimentacao', 'comida', 'lanche', 'almoço', 'almoco', 
+                  'jantar', 'café', 'cafe', 'restaurante', 'mercado', 'supermercado',
+                  'padaria', 'açougue', 'acougue', 'feira', 'delivery'],
+    'transporte': ['transporte', 'uber', 'taxi', 'ônibus', 'onibus', 'metro', 'metrô',
+                 'trem', 'passagem', 'viagem', 'combustível', 'combustivel', 'gasolina',
+                 'álcool', 'alcool', 'diesel', 'posto'],
+    'combustível': ['combustível', 'combustivel', 'gasolina', 'álcool', 'alcool', 
+                  'diesel', 'posto', 'abasteci', 'abastecer'],
+    'saúde': ['saúde', 'saude', 'médico', 'medico', 'hospital', 'farmácia', 'farmacia',
+             'remédio', 'remedio', 'consulta', 'exame', 'dentista', 'plano de saúde'],
+    'educação': ['educação', 'educacao', 'escola', 'faculdade', 'curso', 'livro',
+               'material escolar', 'mensalidade', 'matrícula', 'matricula'],
+    'lazer': ['lazer', 'cinema', 'teatro', 'show', 'festa', 'bar', 'balada',
+             'entretenimento', 'diversão', 'diversao', 'jogo', 'streaming'],
+    'casa': ['casa', 'aluguel', 'condomínio', 'condominio', 'luz', 'água', 'agua',
+            'gás', 'gas', 'internet', 'telefone', 'limpeza', 'móveis', 'moveis'],
+    'roupas': ['roupas', 'roupa', 'calça', 'calca', 'camisa', 'sapato', 'tênis', 'tenis',
+              'vestido', 'saia', 'blusa', 'casaco', 'moda', 'shopping'],
+    'outros': ['outros', 'diverso', 'vário', 'vario', 'geral']
+}
+
+# Preposições comuns removidas da descrição
+_COMMON_WORDS = ('em', 'de', 'com', 'para', 'no', 'na', 'do', 'da', 'r$')
+
+# Uma única alternação para remover palavras-chave de gasto e preposições
+_DESC_STRIP_RE = re.compile(
+    r'\b(?:' + '|'.join(map(re.escape, EXPENSE_KEYWORDS + _COMMON_WORDS)) + r')\b',
+    re.IGNORECASE
+)
+
+def _build_keyword_index():
+    """
+    Monta o índice palavra-chave -> CategoryId e o autômato Aho–Corasick.
+    
+    Quando uma palavra aparece em mais de uma categoria, vale a primeira do
+    mapeamento. O autômato reúne todas as palavras-chave, de modo que uma
+    única passada pela mensagem identifica relatório, gasto e categoria.
+    
+    Returns:
+        Tuple[Dict[str, CategoryId], ahocorasick.Automaton]: Índice e autômato
+    """
+    kw_to_cat = {}
+    for category, keywords in CATEGORY_MAPPING.items():
+        category_id = CATEGORY_IDS[category]
+        for keyword in keywords:
+            kw_to_cat.setdefault(keyword, category_id)
+    
+    keyword_kinds = {}
+    for keyword in REPORT_KEYWORDS:
+        keyword_kinds.setdefault(keyword, []).append(('report', None))
+    for keyword in EXPENSE_KEYWORDS:
+        keyword_kinds.setdefault(keyword, []).append(('expense', None))
+    for keyword, category_id in kw_to_cat.items():
+        keyword_kinds.setdefault(keyword, []).append(('category', category_id))
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, kinds in keyword_kinds.items():
+        automaton.add_word(keyword, tuple(kinds))
+    automaton.make_automaton()
+    
+    return kw_to_cat, automaton
+
+_KW_TO_CAT, _KEYWORD_AUTOMATON = _build_keyword_index()
+
 
 class MessageProcessor:
     """Processador de linguagem natural para mensagens de gastos."""
     
-    def __init__(self):
-        """Inicializa o processador com o modelo spaCy."""
-        try:
-            self.nlp = spacy.load(Config.SPACY_MODEL)
-        except OSError:
-            raise Exception(f"Modelo spaCy '{Config.SPACY_MODEL}' não encontrado. Execute: python -m spacy download {Config.SPACY_MODEL}")
-        
-        # Padrões para identificar valores monetários
-        self.money_patterns = [
-            r'(?:R\$\s*)?(\d+(?:[.,]\d{2})?)',  # R$ 50.00, R$50, 50.00, 50
-            r'(\d+)\s*reais?',  # 50 reais
-            r'(\d+)\s*(?:pila|pratas?)',  # 50 pila, 50 prata (gírias)
-        ]
-        
-        # Palavras-chave para identificar gastos
-        self.expense_keywords = [
-            'gastei', 'gasto', 'paguei', 'comprei', 'saiu', 'custou',
-            'despesa', 'débito', 'conta', 'fatura', 'pagamento'
-        ]
-        
-        # Palavras-chave para relatórios
-        self.report_keywords = [
-            'relatório', 'relatorio', 'resumo', 'total', 'quanto gastei',
-            'balanço', 'balanco', 'extrato', 'histórico', 'historico'
-        ]
+    def __init__(self, fast_mode: bool = False):
+        """
+        Inicializa o processador; o modelo spaCy só é carregado quando necessário.
         
-        # Mapeamento de categorias e suas variações
-        self.category_mapping = {
-            'alimentação': ['alimentação', 'alimentacao', 'comida', 'lanche', 'almoço', 'almoco', 
-                          'jantar', 'café', 'cafe', 'restaurante', 'mercado', 'supermercado',
-                          'padaria', 'açougue', 'acougue', 'feira', 'delivery'],
-            'transporte': ['transporte', 'uber', 'taxi', 'ônibus', 'onibus', 'metro', 'metrô',
-                         'trem', 'passagem', 'viagem', 'combustível', 'combustivel', 'gasolina',
-                         'álcool', 'alcool', 'diesel', 'posto'],
-            'combustível': ['combustível', 'combustivel', 'gasolina', 'álcool', 'alcool', 
-                          'diesel', 'posto', 'abasteci', 'abastecer'],
-            'saúde': ['saúde', 'saude', 'médico', 'medico', 'hospital', 'farmácia', 'farmacia',
-                     'remédio', 'remedio', 'consulta', 'exame', 'dentista', 'plano de saúde'],
-            'educação': ['educação', 'educacao', 'escola', 'faculdade', 'curso', 'livro',
-                       'material escolar', 'mensalidade', 'matrícula', 'matricula'],
-            'lazer': ['lazer', 'cinema', 'teatro', 'show', 'festa', 'bar', 'balada',
-                     'entretenimento', 'diversão', 'diversao', 'jogo', 'streaming'],
-            'casa': ['casa', 'aluguel', 'condomínio', 'condominio', 'luz', 'água', 'agua',
-                    'gás', 'gas', 'internet', 'telefone', 'limpeza', 'móveis', 'moveis'],
-            'roupas': ['roupas', 'roupa', 'calça', 'calca', 'camisa', 'sapato', 'tênis', 'tenis',
-                      'vestido', 'saia', 'blusa', 'casaco', 'moda', 'shopping'],
-            'outros': ['outros', 'diverso', 'vário', 'vario', 'geral']
-        }
+        Args:
+            fast_mode (bool): Se True, nunca usa o spaCy; mensagens sem palavra-chave
+                de categoria caem em 'outros'
+        """
+        self.fast_mode = fast_mode
+        self._nlp = None
+        self._nlp_lock = threading.Lock()
+        
+        # Tabelas e padrões são compilados uma única vez, na importação do
+        # módulo; cada instância apenas guarda referências para eles
+        self.expense_keywords = EXPENSE_KEYWORDS
+        self.report_keywords = REPORT_KEYWORDS
+        self.category_mapping = CATEGORY_MAPPING
+        self._money_re = _MONEY_RE
+        self._desc_strip_re = _DESC_STRIP_RE
+        self._kw_to_cat = _KW_TO_CAT
+        self._keyword_automaton = _KEYWORD_AUTOMATON
+    
+    @property
+    def nlp(self):
+        """Modelo spaCy, carregado no primeiro uso (sem os componentes não utilizados)."""
+        if self._nlp is None:
+            with self._nlp_lock:
+                if self._nlp is None:
+                    import spacy
+                    try:
+                        self._nlp = spacy.load(Config.SPACY_MODEL, exclude=Config.SPACY_EXCLUDE)
+                    except OSError:
+                        raise Exception(f"Modelo spaCy '{Config.SPACY_MODEL}' não encontrado. Execute: python -m spacy download {Config.SPACY_MODEL}")
+        return self._nlp
     
     def process_message(self, message: str) -> Dict:
         """
@@ -71,8 +153,48 @@ class MessageProcessor:
         """
         message = message.lower().strip()
         
-        # Identifica o tipo de mensagem
-        message_type = self._identify_message_type(message)
+        # Identifica o tipo de mensagem e a categoria em uma única passada
+        scan = self._scan_keywords(message)
+        message_type = self._identify_message_type(message, scan)
+        
+        return self._build_result(message, message_type, scan)
+    
+    def process_messages(self, messages: List[str]) -> List[Dict]:
+        """
+        Processa várias mensagens de uma vez.
+        
+        Mensagens resolvidas pelas palavras-chave não passam pelo spaCy; as
+        demais são analisadas em lote com nlp.pipe.
+        
+        Args:
+            messages (List[str]): Mensagens dos usuários
+            
+        Returns:
+            List[Dict]: Informações extraídas, na mesma ordem das mensagens
+        """
+        normalized = [message.lower().strip() for message in messages]
+        scans = [self._scan_keywords(message) for message in normalized]
+        message_types = [self._identify_message_type(message, scan)
+                         for message, scan in zip(normalized, scans)]
+        
+        # Só precisam do spaCy as mensagens sem categoria por palavra-chave
+        pending = [
+            i for i, (message_type, scan) in enumerate(zip(message_types, scans))
+            if message_type in ('expense', 'report') and scan[2] is None
+        ]
+        docs = {}
+        if pending and not self.fast_mode:
+            texts = (normalized[i] for i in pending)
+            docs = dict(zip(pending, self.nlp.pipe(texts, batch_size=64)))
+        
+        return [
+            self._build_result(message, message_type, scan, docs.get(i))
+            for i, (message, message_type, scan) in enumerate(zip(normalized, message_types, scans))
+        ]
+    
+    def _build_result(self, message: str, message_type: str,
+                      scan: Tuple[bool, bool, Optional[str]], doc=None) -> Dict:
+        """Monta o resultado do processamento de uma mensagem já normalizada."""
         
         result = {
             'type': message_type,
@@ -81,26 +203,50 @@ class MessageProcessor:
         }
         
         if message_type == 'expense':
-            expense_data = self._extract_expense_data(message)
+            expense_data = self._extract_expense_data(message, scan, doc)
             result.update(expense_data)
         elif message_type == 'report':
-            report_data = self._extract_report_data(message)
+            report_data = self._extract_report_data(message, scan, doc)
             result.update(report_data)
         
         return result
     
-    def _identify_message_type(self, message: str) -> str:
+    def _scan_keywords(self, message: str) -> Tuple[bool, bool, Optional[CategoryId]]:
+        """
+        Procura todas as palavras-chave da mensagem com o autômato.
+        
+        Returns:
+            Tuple[bool, bool, Optional[CategoryId]]: (é_relatório, é_gasto, categoria)
+        """
+        is_report = False
+        is_expense = False
+        category_id = None
+        
+        for _, matches in self._keyword_automaton.iter(message):
+            for kind, value in matches:
+                if kind == 'report':
+                    is_report = True
+                elif kind == 'expense':
+                    is_expense = True
+                elif category_id is None or value < category_id:
+                    # Mantém a prioridade definida pela ordem dos ids
+                    category_id = value
+        
+        return is_report, is_expense, category_id
+    
+    def _identify_message_type(self, message: str,
+                               scan: Optional[Tuple[bool, bool, Optional[CategoryId]]] = None) -> str:
         """Identifica o tipo de mensagem (gasto, relatório, etc.)."""
         
+        is_report, is_expense, _ = scan or self._scan_keywords(message)
+        
         # Verifica se é uma solicitação de relatório
-        for keyword in self.report_keywords:
-            if keyword in message:
-                return 'report'
+        if is_report:
+            return 'report'
         
         # Verifica se é um gasto
-        for keyword in self.expense_keywords:
-            if keyword in message:
-                return 'expense'
+        if is_expense:
+            return 'expense'
         
         # Verifica se tem valor monetário (pode ser gasto implícito)
         if self._extract_amount(message):
@@ -108,11 +254,13 @@ class MessageProcessor:
         
         return 'unknown'
     
-    def _extract_expense_data(self, message: str) -> Dict:
+    def _extract_expense_data(self, message: str,
+                              scan: Optional[Tuple[bool, bool, Optional[CategoryId]]] = None,
+                              doc=None) -> Dict:
         """Extrai dados de gasto da mensagem."""
         
         amount = self._extract_amount(message)
-        category = self._extract_category(message)
+        category = self._extract_category(message, scan, doc)
         description = self._extract_description(message)
         
         return {
@@ -122,10 +270,12 @@ class MessageProcessor:
             'confidence': self._calculate_confidence(amount, category, description)
         }
     
-    def _extract_report_data(self, message: str) -> Dict:
+    def _extract_report_data(self, message: str,
+                             scan: Optional[Tuple[bool, bool, Optional[CategoryId]]] = None,
+                             doc=None) -> Dict:
         """Extrai dados de solicitação de relatório."""
         
-        category = self._extract_category(message)
+        category = self._extract_category(message, scan, doc)
         period = self._extract_period(message)
         
         return {
@@ -136,60 +286,81 @@ class MessageProcessor:
     def _extract_amount(self, message: str) -> Optional[float]:
         """Extrai valor monetário da mensagem."""
         
-        for pattern in self.money_patterns:
-            matches = re.findall(pattern, message, re.IGNORECASE)
-            if matches:
-                # Pega o primeiro valor encontrado
-                amount_str = matches[0]
-                # Normaliza o formato (substitui vírgula por ponto)
-                amount_str = amount_str.replace(',', '.')
-                try:
-                    return float(amount_str)
-                except ValueError:
-                    continue
-        
-        return None
+        # Pega o primeiro valor encontrado
+        match = self._money_re.search(message)
+        if not match:
+            return None
+        
+        return self._amount_from_match(match)
     
-    def _extract_category(self, message: str) -> Optional[str]:
+    @staticmethod
+    def _amount_from_match(match: re.Match) -> float:
+        """Converte o valor capturado, normalizando vírgula para ponto."""
+        amount_str = match.group('v1') or match.group('v2') or match.group('v3')
+        return float(amount_str.replace(',', '.'))
+    
+    def extract_amounts(self, messages: List[str]) -> List[Optional[float]]:
+        """
+        Extrai o primeiro valor monetário de cada mensagem com uma única varredura.
+        
+        As mensagens são unidas por um separador que o padrão não atravessa, e
+        cada valor encontrado é atribuído à sua mensagem pela posição.
+        
+        Args:
+            messages (List[str]): Mensagens dos usuários
+            
+        Returns:
+            List[Optional[float]]: Valor de cada mensagem (None se não houver)
+        """
+        if any(_BATCH_SEPARATOR in message for message in messages):
+            return [self._extract_amount(message) for message in messages]
+        
+        # Posição inicial de cada mensagem no texto unido
+        starts = list(accumulate((len(message) + 1 for message in messages[:-1]), initial=0))
+        amounts = [None] * len(messages)
+        
+        for match in self._money_re.finditer(_BATCH_SEPARATOR.join(messages)):
+            index = bisect_right(starts, match.start()) - 1
+            if amounts[index] is None:
+                amounts[index] = self._amount_from_match(match)
+        
+        return amounts
+    
+    def _extract_category(self, message: str,
+                          scan: Optional[Tuple[bool, bool, Optional[CategoryId]]] = None,
+                          doc=None) -> Optional[str]:
         """Extrai categoria do gasto da mensagem."""
         
         # Procura por palavras-chave de categorias
-        for category, keywords in self.category_mapping.items():
-            for keyword in keywords:
-                if keyword in message:
-                    return category
+        _, _, category_id = scan or self._scan_keywords(message)
+        if category_id:
+            return category_id.label
+        
+        # No modo rápido não há fallback com spaCy
+        if doc is None and self.fast_mode:
+            return CategoryId.OUTROS.label
         
         # Se não encontrou categoria específica, usa NLP para tentar identificar
-        doc = self.nlp(message)
+        if doc is None:
+            doc = self.nlp(message)
         
         # Procura por substantivos que podem indicar categoria
         for token in doc:
             if token.pos_ == 'NOUN' and not token.is_stop:
-                lemma = token.lemma_.lower()
-                for category, keywords in self.category_mapping.items():
-                    if lemma in keywords:
-                        return category
+                category_id = self._kw_to_cat.get(token.lemma_.lower())
+                if category_id:
+                    return category_id.label
         
-        return 'outros'  # Categoria padrão
+        return CategoryId.OUTROS.label  # Categoria padrão
     
     def _extract_description(self, message: str) -> str:
         """Extrai descrição do gasto."""
         
-        # Remove palavras-chave de gasto e valores monetários
-        description = message
-        
-        # Remove palavras-chave de gasto
-        for keyword in self.expense_keywords:
-            description = re.sub(rf'\b{keyword}\b', '', description, flags=re.IGNORECASE)
-        
         # Remove valores monetários
-        for pattern in self.money_patterns:
-            description = re.sub(pattern, '', description, flags=re.IGNORECASE)
+        description = self._money_re.sub('', message)
         
-        # Remove preposições comuns
-        common_words = ['em', 'de', 'com', 'para', 'no', 'na', 'do', 'da', 'r$']
-        for word in common_words:
-            description = re.sub(rf'\b{word}\b', '', description, flags=re.IGNORECASE)
+        # Remove palavras-chave de gasto e preposições comuns
+        description = self._desc_strip_re.sub('', description)
         
         # Limpa espaços extras
         description = ' '.join(description.split())
@@ -219,23 +390,13 @@ class MessageProcessor:
                             description: str) -> float:
         """Calcula a confiança da extração de dados."""
         
-        confidence = 0.0
-        
-        # Confiança baseada na presença de valor
-        if amount is not None:
-            confidence += 0.4
-        
-        # Confiança baseada na categoria
-        if category and category != 'outros':
-            confidence += 0.3
-        elif category == 'outros':
-            confidence += 0.1
-        
-        # Confiança baseada na descrição
-        if description and description != 'Gasto não especificado':
-            confidence += 0.3
-        
-        return min(confidence, 1.0)
+        # Valor (0.4) + categoria (0.3, ou 0.1 para 'outros') + descrição (0.3);
+        # os pesos somam no máximo 1.0, então não é preciso limitar o resultado
+        return (
+            0.4 * (amount is not None)
+            + (0.1 if category == 'outros' else 0.3 * bool(category))
+            + 0.3 * (bool(description) and description != 'Gasto não especificado')
+        )
     
     def get_categories(self) -> List[str]:
         """Retorna lista de categorias disponíveis."""
@@ -256,3 +417,8 @@ class MessageProcessor:
         
         return True, ""
 
+
+@lru_cache(maxsize=1)
+def get_processor() -> MessageProcessor:
+    """Retorna a instância compartilhada do processador de mensagens."""
+    return MessageProcessor(fast_mode=get_config().NLP_FAST_MODE)
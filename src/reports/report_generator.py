@@ -1,20 +1,62 @@
 """
 Gerador de relatórios e análises de gastos.
 """
-import matplotlib.pyplot as plt
+import matplotlib
+# Backend sem interface gráfica: os gráficos só são renderizados para arquivo/memória
+matplotlib.use('Agg')
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 import seaborn as sns
-import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+import csv
 import io
 import base64
+import threading
 from src.services.expense_service import ExpenseService
 from src.utils.helpers import format_currency, get_period_dates, get_emoji_for_category
 
 # Configurar matplotlib para usar fonte que suporte caracteres especiais
-plt.rcParams['font.family'] = ['DejaVu Sans', 'Liberation Sans', 'sans-serif']
-plt.rcParams['axes.unicode_minus'] = False
+matplotlib.rcParams['font.family'] = ['DejaVu Sans', 'Liberation Sans', 'sans-serif']
+matplotlib.rcParams['axes.unicode_minus'] = False
+
+# Uma figura por thread, reaproveitada entre os gráficos
+_thread_local = threading.local()
+
+
+def _get_figure(figsize: Tuple[float, float]) -> Figure:
+    """Retorna a figura da thread atual, limpa e redimensionada."""
+    fig = getattr(_thread_local, 'figure', None)
+    if fig is None:
+        fig = Figure()
+        _thread_local.figure = fig
+    else:
+        fig.clear()
+    fig.set_size_inches(figsize)
+    return fig
+
+
+def _finalize_figure(fig: Figure, save_path: Optional[str] = None) -> str:
+    """
+    Salva a figura em arquivo ou a retorna como PNG em base64.
+    
+    Args:
+        fig (Figure): Figura já desenhada
+        save_path (str, optional): Caminho para salvar o gráfico
+        
+    Returns:
+        str: Caminho do arquivo ou base64 da imagem
+    """
+    # 150 dpi é suficiente para as imagens enviadas pelo WhatsApp
+    if save_path:
+        fig.savefig(save_path, format='png', dpi=150, bbox_inches='tight')
+        return save_path
+    
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+    # getbuffer() expõe os bytes sem copiar o PNG
+    return base64.b64encode(buffer.getbuffer()).decode('ascii')
+
 
 class ReportGenerator:
     """Gerador de relatórios e visualizações de gastos."""
@@ -31,21 +73,12 @@ class ReportGenerator:
         Returns:
             Dict: Resumo dos gastos
         """
-        # Obtém dados do período
-        expenses = ExpenseService.get_expenses_by_period(user_phone, period)
+        # Apenas agregados calculados no banco; a lista de gastos fica na API paginada
+        totals = ExpenseService.get_period_totals(user_phone, period)
         category_summary = ExpenseService.get_category_summary(user_phone, period)
         
-        # Calcula estatísticas
-        total_amount = sum(expense.amount for expense in expenses)
-        total_count = len(expenses)
-        
-        # Média por gasto
-        avg_per_expense = total_amount / total_count if total_count > 0 else 0
-        
-        # Categoria com maior gasto
-        top_category = None
-        if category_summary:
-            top_category = max(category_summary, key=lambda x: x['total'])
+        # Categoria com maior gasto (o resumo já vem ordenado pelo total)
+        top_category = category_summary[0] if category_summary else None
         
         # Período de datas
         start_date, end_date = get_period_dates(period)
@@ -54,12 +87,11 @@ class ReportGenerator:
             'period': period,
             'start_date': start_date.isoformat(),
             'end_date': end_date.isoformat(),
-            'total_amount': total_amount,
-            'total_count': total_count,
-            'avg_per_expense': avg_per_expense,
+            'total_amount': totals['total'],
+            'total_count': totals['count'],
+            'avg_per_expense': totals['average'],
             'top_category': top_category,
-            'category_breakdown': category_summary,
-            'expenses': [expense.to_dict() for expense in expenses]
+            'category_breakdown': category_summary
         }
     
     @staticmethod
@@ -86,10 +118,11 @@ class ReportGenerator:
         amounts = [item['total'] for item in category_summary]
         
         # Cria o gráfico
-        plt.figure(figsize=(10, 8))
-        colors = plt.cm.Set3(range(len(categories)))
+        fig = _get_figure((10, 8))
+        ax = fig.add_subplot()
+        colors = matplotlib.colormaps['Set3'](range(len(categories)))
         
-        wedges, texts, autotexts = plt.pie(
+        wedges, texts, autotexts = ax.pie(
             amounts, 
             labels=categories,
             autopct='%1.1f%%',
@@ -98,28 +131,17 @@ class ReportGenerator:
         )
         
         # Personaliza o gráfico
-        plt.title(f'Gastos por Categoria - {period.title()}', fontsize=16, fontweight='bold')
+        ax.set_title(f'Gastos por Categoria - {period.title()}', fontsize=16, fontweight='bold')
         
         # Adiciona legenda com valores
         legend_labels = [f'{cat}: {format_currency(amt)}' 
                         for cat, amt in zip(categories, amounts)]
-        plt.legend(wedges, legend_labels, title="Categorias", 
+        ax.legend(wedges, legend_labels, title="Categorias", 
                   loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
         
-        plt.tight_layout()
+        fig.tight_layout()
         
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            return save_path
-        else:
-            # Retorna como base64
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-            buffer.seek(0)
-            image_base64 = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-            return image_base64
+        return _finalize_figure(fig, save_path)
     
     @staticmethod
     def generate_timeline_chart(user_phone: str, period: str = 'month',
@@ -135,57 +157,41 @@ class ReportGenerator:
         Returns:
             str: Caminho do arquivo ou base64 da imagem
         """
-        expenses = ExpenseService.get_expenses_by_period(user_phone, period)
+        # Totais diários agregados no banco
+        daily_totals = ExpenseService.get_daily_totals(user_phone, period)
         
-        if not expenses:
+        if not daily_totals:
             return None
         
-        # Converte para DataFrame
-        df = pd.DataFrame([expense.to_dict() for expense in expenses])
-        df['created_at'] = pd.to_datetime(df['created_at'])
-        df['date'] = df['created_at'].dt.date
-        
-        # Agrupa por data
-        daily_totals = df.groupby('date')['amount'].sum().reset_index()
+        dates, amounts = zip(*daily_totals)
         
         # Cria o gráfico
-        plt.figure(figsize=(12, 6))
-        plt.plot(daily_totals['date'], daily_totals['amount'], 
-                marker='o', linewidth=2, markersize=6)
+        fig = _get_figure((12, 6))
+        ax = fig.add_subplot()
+        ax.plot(dates, amounts, marker='o', linewidth=2, markersize=6)
         
         # Personaliza o gráfico
-        plt.title(f'Gastos Diários - {period.title()}', fontsize=16, fontweight='bold')
-        plt.xlabel('Data', fontsize=12)
-        plt.ylabel('Valor (R$)', fontsize=12)
-        plt.grid(True, alpha=0.3)
+        ax.set_title(f'Gastos Diários - {period.title()}', fontsize=16, fontweight='bold')
+        ax.set_xlabel('Data', fontsize=12)
+        ax.set_ylabel('Valor (R$)', fontsize=12)
+        ax.grid(True, alpha=0.3)
         
         # Formata eixo X
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%d/%m'))
-        plt.gca().xaxis.set_major_locator(mdates.DayLocator(interval=max(1, len(daily_totals) // 10)))
-        plt.xticks(rotation=45)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m'))
+        ax.xaxis.set_major_locator(mdates.DayLocator(interval=max(1, len(dates) // 10)))
+        ax.tick_params(axis='x', labelrotation=45)
         
         # Adiciona valores nos pontos
-        for i, row in daily_totals.iterrows():
-            plt.annotate(f'R$ {row["amount"]:.0f}', 
-                        (row['date'], row['amount']),
+        for day, amount in daily_totals:
+            ax.annotate(f'R$ {amount:.0f}', 
+                        (day, amount),
                         textcoords="offset points", 
                         xytext=(0,10), 
                         ha='center', fontsize=9)
         
-        plt.tight_layout()
+        fig.tight_layout()
         
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            return save_path
-        else:
-            # Retorna como base64
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-            buffer.seek(0)
-            image_base64 = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-            return image_base64
+        return _finalize_figure(fig, save_path)
     
     @staticmethod
     def generate_comparison_chart(user_phone: str, save_path: Optional[str] = None) -> str:
@@ -209,34 +215,24 @@ class ReportGenerator:
             totals.append(total)
         
         # Cria o gráfico
-        plt.figure(figsize=(10, 6))
-        bars = plt.bar(period_names, totals, color=['#FF6B6B', '#4ECDC4', '#45B7D1'])
+        fig = _get_figure((10, 6))
+        ax = fig.add_subplot()
+        bars = ax.bar(period_names, totals, color=['#FF6B6B', '#4ECDC4', '#45B7D1'])
         
         # Personaliza o gráfico
-        plt.title('Comparativo de Gastos por Período', fontsize=16, fontweight='bold')
-        plt.ylabel('Valor (R$)', fontsize=12)
-        plt.grid(True, alpha=0.3, axis='y')
+        ax.set_title('Comparativo de Gastos por Período', fontsize=16, fontweight='bold')
+        ax.set_ylabel('Valor (R$)', fontsize=12)
+        ax.grid(True, alpha=0.3, axis='y')
         
         # Adiciona valores nas barras
         for bar, total in zip(bars, totals):
             height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height + max(totals) * 0.01,
+            ax.text(bar.get_x() + bar.get_width()/2., height + max(totals) * 0.01,
                     format_currency(total), ha='center', va='bottom', fontsize=11)
         
-        plt.tight_layout()
+        fig.tight_layout()
         
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            return save_path
-        else:
-            # Retorna como base64
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-            buffer.seek(0)
-            image_base64 = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-            return image_base64
+        return _finalize_figure(fig, save_path)
     
     @staticmethod
     def generate_detailed_report(user_phone: str, period: str = 'month') -> str:
@@ -298,22 +294,50 @@ class ReportGenerator:
             report += "\n"
         
         # Últimos gastos
-        if summary['expenses']:
+        recent_expenses = ExpenseService.get_recent_expense_rows(user_phone, period, limit=5)
+        if recent_expenses:
             report += "*ÚLTIMOS GASTOS:*\n"
             report += "-" * 15 + "\n"
             
-            recent_expenses = sorted(summary['expenses'], 
-                                   key=lambda x: x['created_at'], reverse=True)[:5]
-            
-            for expense in recent_expenses:
-                date = datetime.fromisoformat(expense['created_at']).strftime('%d/%m %H:%M')
-                emoji = get_emoji_for_category(expense['category'])
+            for created_at, amount, category, description in recent_expenses:
+                date = created_at.strftime('%d/%m %H:%M')
+                emoji = get_emoji_for_category(category)
                 
-                report += f"{emoji} {format_currency(expense['amount'])} - {expense['category'].title()}\n"
-                report += f"   {expense['description']} ({date})\n"
+                report += f"{emoji} {format_currency(amount)} - {category.title()}\n"
+                report += f"   {description} ({date})\n"
         
         return report
     
+    @staticmethod
+    def iter_csv_rows(user_phone: str, period: str = 'month') -> Iterator[str]:
+        """
+        Gera o CSV dos gastos linha a linha, direto do cursor do banco.
+        
+        A primeira linha é o cabeçalho (com BOM, para o Excel reconhecer UTF-8).
+        
+        Args:
+            user_phone (str): Telefone do usuário
+            period (str): Período
+            
+        Returns:
+            Iterator[str]: Linhas do CSV
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        def flush() -> str:
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return line
+        
+        writer.writerow(['Data', 'Valor', 'Categoria', 'Descrição', 'Confiança'])
+        yield '\ufeff' + flush()
+        
+        for row in ExpenseService.iter_export_rows(user_phone, period):
+            writer.writerow((row.created_at.strftime('%d/%m/%Y %H:%M'), *row[1:]))
+            yield flush()
+    
     @staticmethod
     def export_to_csv(user_phone: str, period: str = 'month', 
                      file_path: str = None) -> str:
@@ -328,28 +352,22 @@ class ReportGenerator:
         Returns:
             str: Caminho do arquivo CSV
         """
-        expenses = ExpenseService.get_expenses_by_period(user_phone, period)
+        lines = ReportGenerator.iter_csv_rows(user_phone, period)
+        header = next(lines)
+        first_line = next(lines, None)
         
-        if not expenses:
+        if first_line is None:
             return None
         
-        # Converte para DataFrame
-        df = pd.DataFrame([expense.to_dict() for expense in expenses])
-        
-        # Seleciona e renomeia colunas
-        df = df[['created_at', 'amount', 'category', 'description', 'confidence']]
-        df.columns = ['Data', 'Valor', 'Categoria', 'Descrição', 'Confiança']
-        
-        # Formata data
-        df['Data'] = pd.to_datetime(df['Data']).dt.strftime('%d/%m/%Y %H:%M')
-        
         # Define caminho do arquivo
         if not file_path:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             file_path = f'gastos_{user_phone}_{period}_{timestamp}.csv'
         
-        # Salva CSV
-        df.to_csv(file_path, index=False, encoding='utf-8-sig')
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(header)
+            f.write(first_line)
+            f.writelines(lines)
         
         return file_path
 
@@ -1,211 +1,351 @@
 """
 Rotas para relatórios e análises.
 """
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, g, request, jsonify, make_response, send_file, stream_with_context
+from src.config.settings import Config
 from src.reports.report_generator import ReportGenerator
-from src.services.expense_service import ExpenseService
+from src.services.expense_service import ExpenseService, PERIODS
+from src.utils.helpers import sanitize_input
+from datetime import date
+from contextlib import contextmanager
+from functools import wraps
+from uuid import uuid4
+import hashlib
+import io
+import itertools
 import os
-import tempfile
+import threading
+import time
+import unicodedata
+from urllib.parse import quote
 
 reports_bp = Blueprint('reports', __name__)
 
+# Gráficos em cache (e renderizações incompletas) são limpos periodicamente
+TMP_FILE_MAX_AGE = 5 * 60
+CHART_CACHE_MAX_AGE = 24 * 60 * 60
+CLEANUP_INTERVAL = 60
+
+os.makedirs(Config.CHART_CACHE_DIR, exist_ok=True)
+
+def _remove_stale_files(directory, max_age, suffix=''):
+    """Remove arquivos do diretório modificados há mais de max_age segundos."""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    
+    for entry in entries:
+        if not entry.name.endswith(suffix):
+            continue
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+def _cleanup_loop():
+    """Limpa renderizações esquecidas e gráficos antigos do cache."""
+    while True:
+        _remove_stale_files(Config.CHART_CACHE_DIR, TMP_FILE_MAX_AGE, suffix='.tmp')
+        _remove_stale_files(Config.CHART_CACHE_DIR, CHART_CACHE_MAX_AGE, suffix='.png')
+        time.sleep(CLEANUP_INTERVAL)
+
+@reports_bp.record_once
+def _start_cleanup(state):
+    """Inicia a limpeza periódica quando o blueprint é registrado."""
+    threading.Thread(target=_cleanup_loop, name='reports-tmp-cleanup', daemon=True).start()
+
+def _data_version(user_phone, period):
+    """
+    Calcula a versão dos dados que sustentam a resposta da requisição atual.
+    
+    Combina a rota, o usuário, o período, o dia atual (os períodos são
+    relativos a hoje) e a "impressão digital" dos gastos do período. Outros
+    parâmetros da URL não entram na chave: não alteram a resposta e não devem
+    gerar novas entradas no cache de gráficos.
+    
+    Args:
+        user_phone (str): Telefone do usuário
+        period (str): Período já validado
+        
+    Returns:
+        str: Hash que identifica a versão dos dados
+    """
+    count, last_updated = ExpenseService.get_data_fingerprint(user_phone, period)
+    g.has_data = count > 0
+    key = f'{request.endpoint}:{user_phone}:{period}:{date.today().isoformat()}:{count}:{last_updated}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def conditional_on_data(period=None):
+    """
+    Decorator que responde 304 Not Modified quando os dados não mudaram.
+    
+    A versão dos dados é usada como ETag e fica disponível em g.data_version.
+    Sem período fixo, o parâmetro 'period' é validado (400 se inválido).
+    
+    Args:
+        period (str, optional): Período fixo; por padrão usa o parâmetro 'period'
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(user_phone, **kwargs):
+            data_period = period or request.args.get('period', 'month')
+            if data_period not in PERIODS:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Período inválido. Use: {", ".join(PERIODS)}'
+                }), 400
+            
+            g.data_version = _data_version(user_phone, data_period)
+            
+            if request.if_none_match.contains(g.data_version):
+                response = Response(status=304)
+                response.set_etag(g.data_version)
+                return response
+            
+            response = make_response(view(user_phone, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(g.data_version)
+            return response
+        return wrapper
+    return decorator
+
+def handle_errors(view):
+    """Decorator que converte exceções da rota em resposta JSON de erro (500)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        except Exception as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 500
+    return wrapper
+
+@contextmanager
+def _temp_path(directory, suffix):
+    """Fornece um caminho temporário único, removido ao sair se ainda existir."""
+    path = os.path.join(directory, f'{uuid4().hex}{suffix}')
+    try:
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+def _cached_chart_path(render):
+    """
+    Retorna o gráfico em cache, renderizando-o só quando os dados mudaram.
+    
+    O arquivo é nomeado pela versão dos dados (g.data_version). Sem gastos no
+    período nada é gravado no cache: o gráfico vazio é devolvido em memória.
+    
+    Args:
+        render (Callable[[str], Optional[str]]): Gera o gráfico no caminho recebido
+        
+    Returns:
+        Optional[Union[str, IO[bytes]]]: Caminho do PNG (ou o PNG em memória)
+            ou None se não houver dados
+    """
+    if not g.has_data:
+        with _temp_path(Config.CHART_CACHE_DIR, '.tmp') as tmp_path:
+            if not render(tmp_path):
+                return None
+            with open(tmp_path, 'rb') as chart:
+                return io.BytesIO(chart.read())
+    
+    chart_path = os.path.join(Config.CHART_CACHE_DIR, f'{g.data_version}.png')
+    
+    if os.path.exists(chart_path):
+        return chart_path
+    
+    # Renderiza num arquivo temporário e publica com os.replace (atômico)
+    with _temp_path(Config.CHART_CACHE_DIR, '.tmp') as tmp_path:
+        if not render(tmp_path):
+            return None
+        os.replace(tmp_path, chart_path)
+    
+    return chart_path
+
 @reports_bp.route('/reports/summary/<user_phone>')
+@handle_errors
+@conditional_on_data()
 def get_expense_summary(user_phone):
     """Retorna resumo de gastos do usuário."""
     
     period = request.args.get('period', 'month')
     
-    try:
-        summary = ReportGenerator.generate_expense_summary(user_phone, period)
-        return jsonify({
-            'status': 'success',
-            'data': summary
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    summary = ReportGenerator.generate_expense_summary(user_phone, period)
+    return jsonify({
+        'status': 'success',
+        'data': summary
+    })
 
 @reports_bp.route('/reports/chart/category/<user_phone>')
+@handle_errors
+@conditional_on_data()
 def get_category_chart(user_phone):
     """Retorna gráfico de pizza por categoria."""
     
     period = request.args.get('period', 'month')
     
-    try:
-        # Gera gráfico temporário
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            chart_path = ReportGenerator.generate_category_chart(
-                user_phone, period, tmp_file.name
-            )
-            
-            if chart_path:
-                return send_file(chart_path, mimetype='image/png')
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Nenhum dado encontrado para o período'
-                }), 404
-                
-    except Exception as e:
+    # Reaproveita o gráfico em cache enquanto os dados não mudarem
+    chart_path = _cached_chart_path(
+        lambda path: ReportGenerator.generate_category_chart(user_phone, period, path)
+    )
+    
+    if chart_path:
+        return send_file(chart_path, mimetype='image/png')
+    else:
         return jsonify({
             'status': 'error',
-            'message': str(e)
-        }), 500
-    finally:
-        # Limpa arquivo temporário
-        if 'chart_path' in locals() and chart_path and os.path.exists(chart_path):
-            os.unlink(chart_path)
+            'message': 'Nenhum dado encontrado para o período'
+        }), 404
 
 @reports_bp.route('/reports/chart/timeline/<user_phone>')
+@handle_errors
+@conditional_on_data()
 def get_timeline_chart(user_phone):
     """Retorna gráfico de linha temporal."""
     
     period = request.args.get('period', 'month')
     
-    try:
-        # Gera gráfico temporário
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            chart_path = ReportGenerator.generate_timeline_chart(
-                user_phone, period, tmp_file.name
-            )
-            
-            if chart_path:
-                return send_file(chart_path, mimetype='image/png')
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Nenhum dado encontrado para o período'
-                }), 404
-                
-    except Exception as e:
+    # Reaproveita o gráfico em cache enquanto os dados não mudarem
+    chart_path = _cached_chart_path(
+        lambda path: ReportGenerator.generate_timeline_chart(user_phone, period, path)
+    )
+    
+    if chart_path:
+        return send_file(chart_path, mimetype='image/png')
+    else:
         return jsonify({
             'status': 'error',
-            'message': str(e)
-        }), 500
-    finally:
-        # Limpa arquivo temporário
-        if 'chart_path' in locals() and chart_path and os.path.exists(chart_path):
-            os.unlink(chart_path)
+            'message': 'Nenhum dado encontrado para o período'
+        }), 404
 
 @reports_bp.route('/reports/chart/comparison/<user_phone>')
+@handle_errors
+@conditional_on_data('all')
 def get_comparison_chart(user_phone):
     """Retorna gráfico comparativo entre períodos."""
     
-    try:
-        # Gera gráfico temporário
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            chart_path = ReportGenerator.generate_comparison_chart(
-                user_phone, tmp_file.name
-            )
-            
-            if chart_path:
-                return send_file(chart_path, mimetype='image/png')
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Nenhum dado encontrado'
-                }), 404
-                
-    except Exception as e:
+    # Reaproveita o gráfico em cache enquanto os dados não mudarem
+    chart_path = _cached_chart_path(
+        lambda path: ReportGenerator.generate_comparison_chart(user_phone, path)
+    )
+    
+    if chart_path:
+        return send_file(chart_path, mimetype='image/png')
+    else:
         return jsonify({
             'status': 'error',
-            'message': str(e)
-        }), 500
-    finally:
-        # Limpa arquivo temporário
-        if 'chart_path' in locals() and chart_path and os.path.exists(chart_path):
-            os.unlink(chart_path)
+            'message': 'Nenhum dado encontrado'
+        }), 404
 
 @reports_bp.route('/reports/detailed/<user_phone>')
+@handle_errors
+@conditional_on_data()
 def get_detailed_report(user_phone):
     """Retorna relatório detalhado em texto."""
     
     period = request.args.get('period', 'month')
     
-    try:
-        report = ReportGenerator.generate_detailed_report(user_phone, period)
-        return jsonify({
-            'status': 'success',
-            'data': {
-                'report': report,
-                'period': period
-            }
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    report = ReportGenerator.generate_detailed_report(user_phone, period)
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'report': report,
+            'period': period
+        }
+    })
+
+def _set_attachment(response, filename):
+    """
+    Define o Content-Disposition de download como o send_file faria.
+    
+    O werkzeug coloca as aspas necessárias; nomes fora do ASCII ganham uma
+    versão simplificada em filename e a original em filename* (RFC 5987).
+    
+    Args:
+        response (Response): Resposta a ser baixada
+        filename (str): Nome do arquivo, já sem caracteres de controle
+    """
+    options = {'filename': filename}
+    if not filename.isascii():
+        options['filename'] = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        options['filename*'] = f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"
+    response.headers.set('Content-Disposition', 'attachment', **options)
 
 @reports_bp.route('/reports/export/csv/<user_phone>')
+@handle_errors
 def export_csv(user_phone):
     """Exporta gastos para CSV."""
     
     period = request.args.get('period', 'month')
     
-    try:
-        # Gera CSV temporário
-        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as tmp_file:
-            csv_path = ReportGenerator.export_to_csv(
-                user_phone, period, tmp_file.name
-            )
-            
-            if csv_path:
-                return send_file(
-                    csv_path, 
-                    mimetype='text/csv',
-                    as_attachment=True,
-                    download_name=f'gastos_{user_phone}_{period}.csv'
-                )
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Nenhum dado encontrado para exportar'
-                }), 404
-                
-    except Exception as e:
+    lines = ReportGenerator.iter_csv_rows(user_phone, period)
+    header = next(lines)
+    first_line = next(lines, None)
+    
+    if first_line is None:
         return jsonify({
             'status': 'error',
-            'message': str(e)
-        }), 500
-    finally:
-        # Limpa arquivo temporário
-        if 'csv_path' in locals() and csv_path and os.path.exists(csv_path):
-            os.unlink(csv_path)
+            'message': 'Nenhum dado encontrado para exportar'
+        }), 404
+    
+    # Envia as linhas conforme saem do banco, sem arquivo temporário
+    response = Response(
+        stream_with_context(itertools.chain((header, first_line), lines)),
+        mimetype='text/csv'
+    )
+    _set_attachment(response, sanitize_input(f'gastos_{user_phone}_{period}.csv'))
+    return response
 
 @reports_bp.route('/reports/statistics/<user_phone>')
+@handle_errors
+@conditional_on_data('all')
 def get_user_statistics(user_phone):
     """Retorna estatísticas do usuário."""
     
-    try:
-        stats = ExpenseService.get_user_statistics(user_phone)
-        return jsonify({
-            'status': 'success',
-            'data': stats
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    stats = ExpenseService.get_user_statistics(user_phone)
+    return jsonify({
+        'status': 'success',
+        'data': stats
+    })
 
 @reports_bp.route('/reports/categories/<user_phone>')
+@handle_errors
+@conditional_on_data()
 def get_category_summary(user_phone):
     """Retorna resumo por categorias."""
     
     period = request.args.get('period', 'month')
     
-    try:
-        summary = ExpenseService.get_category_summary(user_phone, period)
-        return jsonify({
-            'status': 'success',
-            'data': summary
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    summary = ExpenseService.get_category_summary(user_phone, period)
+    return jsonify({
+        'status': 'success',
+        'data': summary
+    })
 
+@reports_bp.route('/reports/expenses/<user_phone>')
+@handle_errors
+def get_expenses(user_phone):
+    """Retorna os gastos do período, paginados."""
+    
+    period = request.args.get('period', 'month')
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    
+    pagination = ExpenseService.get_expenses_page(user_phone, period, page, per_page)
+    return jsonify({
+        'status': 'success',
+        'data': pagination.items,
+        'pagination': {
+            'page': pagination.page,
+            'per_page': pagination.per_page,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+    })
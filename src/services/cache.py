@@ -0,0 +1,10 @@
+"""
+Cache compartilhado pelos serviços.
+"""
+from flask_caching import Cache
+
+# Inicializado com cache.init_app(app) junto com o banco de dados
+cache = Cache()
+
+# Tempo de vida (segundos) dos agregados memoizados por usuário
+AGGREGATE_CACHE_TIMEOUT = 60
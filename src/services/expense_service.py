@@ -1,13 +1,43 @@
 """
 Serviço para gerenciamento de gastos.
 """
-from datetime import datetime
-from typing import List, Dict, Optional
-from sqlalchemy import and_
+from datetime import date, datetime
+from typing import Iterator, List, Dict, Optional, Tuple
+from sqlalchemy import case, insert, select
 from src.models.user import db
 from src.models.expense import Expense, Category, UserSettings
+from src.services.cache import cache, AGGREGATE_CACHE_TIMEOUT
 from src.utils.helpers import get_period_dates
 
+# Períodos aceitos pelos relatórios (usados para invalidar o cache)
+PERIODS = ('today', 'yesterday', 'week', 'month', 'year', 'all')
+
+# Categoria dos relatórios que equivale a não filtrar
+ALL_CATEGORIES = "todas as categorias"
+
+
+def _period_filter(user_phone: str, period: str, category: Optional[str] = None) -> List:
+    """
+    Monta as condições de filtro dos gastos de um usuário no período.
+
+    Args:
+        user_phone (str): Telefone do usuário
+        period (str): Período ('today', 'week', 'month', ...)
+        category (str, optional): Categoria; None ou ALL_CATEGORIES não filtram
+
+    Returns:
+        List: Condições para usar em select(...).where(*condições)
+    """
+    start_date, end_date = get_period_dates(period)
+    conditions = [
+        Expense.user_phone == user_phone,
+        Expense.created_at >= start_date,
+        Expense.created_at <= end_date,
+    ]
+    if category and category != ALL_CATEGORIES:
+        conditions.append(Expense.category == category)
+    return conditions
+
 
 class ExpenseService:
     """Serviço para operações relacionadas a gastos."""
@@ -20,98 +50,230 @@ class ExpenseService:
         expense = Expense.create_from_message_data(user_phone, message_data)
         db.session.add(expense)
         db.session.commit()
+        ExpenseService.invalidate_user_cache(user_phone, expense.category)
         return expense
 
+    @staticmethod
+    def create_expenses_bulk(user_phone: str, message_datas: List[dict]) -> int:
+        """
+        Cria vários gastos do mesmo usuário com um único INSERT e um único commit.
+
+        Args:
+            user_phone (str): Telefone do usuário
+            message_datas (List[dict]): Dados processados de cada mensagem
+
+        Returns:
+            int: Quantidade de gastos criados
+        """
+        rows = [Expense.values_from_message_data(user_phone, data) for data in message_datas]
+        if not rows:
+            return 0
+
+        now = datetime.utcnow()
+        for row in rows:
+            row['created_at'] = row['updated_at'] = now
+
+        db.session.execute(insert(Expense), rows)
+        db.session.commit()
+        ExpenseService.invalidate_user_cache(user_phone, *{row['category'] for row in rows})
+        return len(rows)
+
+    @staticmethod
+    def invalidate_user_cache(user_phone: str, *categories: str) -> None:
+        """
+        Remove do cache os agregados do usuário afetados por uma alteração.
+
+        Args:
+            user_phone (str): Telefone do usuário
+            *categories (str): Categorias dos gastos alterados
+        """
+        cache.delete_memoized(ExpenseService.get_user_statistics, user_phone)
+        for period in PERIODS:
+            cache.delete_memoized(ExpenseService.get_category_summary, user_phone, period)
+            for category in (None, ALL_CATEGORIES, *categories):
+                cache.delete_memoized(ExpenseService.get_total_by_period, user_phone, period, category)
+
     @staticmethod
     def get_expenses_by_user(user_phone: str, limit: int = 100) -> List[Expense]:
         """
         Retorna gastos de um usuário.
         """
-        return (
-            Expense.query
-            .filter(Expense.user_phone == user_phone)
-            .order_by(Expense.created_at.desc())
+        stmt = (
+            select(Expense)
+            .where(Expense.user_phone == user_phone)
+            .order_by(Expense.created_at.desc(), Expense.id.desc())
             .limit(limit)
-            .all()
         )
+        return db.session.scalars(stmt).all()
 
     @staticmethod
-    def get_expenses_by_period(user_phone: str, period: str, category: Optional[str] = None) -> List[Expense]:
+    def get_expenses_by_period(user_phone: str, period: str, category: Optional[str] = None,
+                               limit: Optional[int] = None) -> List[Expense]:
         """
-        Retorna gastos de um período específico.
+        Retorna gastos de um período específico (os mais recentes primeiro).
         """
-        start_date, end_date = get_period_dates(period)
+        stmt = select(Expense).where(*_period_filter(user_phone, period, category))
+        stmt = stmt.order_by(Expense.created_at.desc(), Expense.id.desc())
+        if limit is not None:
+            stmt = stmt.limit(limit)
 
-        query = Expense.query.filter(
-            and_(
-                Expense.user_phone == user_phone,
-                Expense.created_at >= start_date,
-                Expense.created_at <= end_date,
-            )
+        return db.session.scalars(stmt).all()
+
+    @staticmethod
+    def get_expenses_by_period_rows(user_phone: str, period: str, category: Optional[str] = None,
+                                    limit: Optional[int] = None) -> List[Tuple]:
+        """
+        Versão somente leitura de get_expenses_by_period: retorna linhas simples
+        (os mais recentes primeiro), sem instanciar os modelos.
+
+        Cada linha contém (created_at, amount, category, description).
+        """
+        stmt = (
+            select(Expense.created_at, Expense.amount, Expense.category, Expense.description)
+            .where(*_period_filter(user_phone, period, category))
         )
+        stmt = stmt.order_by(Expense.created_at.desc(), Expense.id.desc())
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        return db.session.execute(stmt).all()
 
-        if category and category != "todas as categorias":
-            query = query.filter(Expense.category == category)
+    @staticmethod
+    def get_recent_expense_rows(user_phone: str, period: str, limit: int = 5) -> List[Tuple]:
+        """
+        Retorna os gastos mais recentes do período como linhas simples.
+        """
+        return ExpenseService.get_expenses_by_period_rows(user_phone, period, limit=limit)
+
+    @staticmethod
+    def get_expenses_page(user_phone: str, period: str, page: int = 1, per_page: int = 20):
+        """
+        Retorna uma página dos gastos do período (os mais recentes primeiro).
+        """
+        stmt = (
+            select(Expense)
+            .where(*_period_filter(user_phone, period))
+            .order_by(Expense.created_at.desc(), Expense.id.desc())
+        )
 
-        return query.order_by(Expense.created_at.desc()).all()
+        return db.paginate(stmt, page=page, per_page=per_page, max_per_page=100, error_out=False)
 
     @staticmethod
+    def iter_export_rows(user_phone: str, period: str, batch_size: int = 1000) -> Iterator[Tuple]:
+        """
+        Percorre os gastos do período em lotes, sem carregar tudo em memória.
+
+        Cada linha contém (created_at, amount, category, description, confidence).
+        """
+        stmt = (
+            select(Expense.created_at, Expense.amount, Expense.category,
+                   Expense.description, Expense.confidence)
+            .where(*_period_filter(user_phone, period))
+            .order_by(Expense.created_at.desc(), Expense.id.desc())
+            .execution_options(yield_per=batch_size)
+        )
+
+        yield from db.session.execute(stmt)
+
+    @staticmethod
+    @cache.memoize(timeout=AGGREGATE_CACHE_TIMEOUT)
     def get_total_by_period(user_phone: str, period: str, category: Optional[str] = None) -> float:
         """
         Retorna o total gasto em um período (consulta agregada no banco).
         """
-        start_date, end_date = get_period_dates(period)
+        stmt = (
+            select(db.func.sum(Expense.amount))
+            .where(*_period_filter(user_phone, period, category))
+        )
+        total = db.session.scalar(stmt) or 0.0
+        return float(total)
+
+    @staticmethod
+    def get_period_totals(user_phone: str, period: str) -> Dict:
+        """
+        Retorna total, quantidade e média dos gastos do período (uma única consulta agregada).
+        """
+        stmt = select(
+            db.func.sum(Expense.amount),
+            db.func.count(1),
+            db.func.avg(Expense.amount),
+        ).where(*_period_filter(user_phone, period))
+        total, count, average = db.session.execute(stmt).one()
+
+        return {
+            "total": float(total or 0.0),
+            "count": int(count or 0),
+            "average": float(average or 0.0),
+        }
+
+    @staticmethod
+    def get_data_fingerprint(user_phone: str, period: str) -> Tuple[int, Optional[datetime]]:
+        """
+        Retorna (quantidade, última atualização) dos gastos do período.
 
-        q = db.session.query(db.func.sum(Expense.amount)).filter(
-            Expense.user_phone == user_phone,
-            Expense.created_at >= start_date,
-            Expense.created_at <= end_date,
+        Usada para saber se dados derivados, como gráficos, ainda estão
+        atualizados. É resolvida só pelo índice cobrindo ix_expenses_user_created,
+        sem ler a tabela, mas percorre as entradas de todos os gastos do período.
+        """
+        stmt = (
+            select(db.func.count(1), db.func.max(Expense.updated_at))
+            .where(*_period_filter(user_phone, period))
         )
+        count, last_updated = db.session.execute(stmt).one()
+        return int(count), last_updated
 
-        if category and category != "todas as categorias":
-            q = q.filter(Expense.category == category)
+    @staticmethod
+    def get_daily_totals(user_phone: str, period: str) -> List[Tuple[date, float]]:
+        """
+        Retorna o total gasto por dia no período, em ordem cronológica.
+        """
+        day = db.func.date(Expense.created_at)
 
-        total = q.scalar() or 0.0
-        return float(total)
+        stmt = (
+            select(day, db.func.sum(Expense.amount))
+            .where(*_period_filter(user_phone, period))
+            .group_by(day)
+            .order_by(day)
+        )
+        rows = db.session.execute(stmt).all()
+
+        # SQLite devolve a data como texto ISO; outros bancos já devolvem date
+        return [
+            (d if isinstance(d, date) else date.fromisoformat(d), float(total))
+            for d, total in rows
+        ]
 
     @staticmethod
     def get_expenses_by_category(user_phone: str, category: str, limit: int = 50) -> List[Expense]:
         """
         Retorna gastos de uma categoria específica.
         """
-        return (
-            Expense.query
-            .filter(Expense.user_phone == user_phone, Expense.category == category)
-            .order_by(Expense.created_at.desc())
+        stmt = (
+            select(Expense)
+            .where(Expense.user_phone == user_phone, Expense.category == category)
+            .order_by(Expense.created_at.desc(), Expense.id.desc())
             .limit(limit)
-            .all()
         )
+        return db.session.scalars(stmt).all()
 
     @staticmethod
+    @cache.memoize(timeout=AGGREGATE_CACHE_TIMEOUT)
     def get_category_summary(user_phone: str, period: str = "month") -> List[Dict]:
         """
-        Retorna resumo por categoria (total e contagem) no período.
+        Retorna resumo por categoria (total e contagem) no período,
+        ordenado do maior para o menor total.
         """
-        start_date, end_date = get_period_dates(period)
-
-        results = (
-            db.session.query(
-                Expense.category,
-                db.func.sum(Expense.amount).label("total"),
-                db.func.count(1).label("count"),
-            )
-            .filter(
-                Expense.user_phone == user_phone,
-                Expense.created_at >= start_date,
-                Expense.created_at <= end_date,
-            )
+        total = db.func.sum(Expense.amount).label("total")
+        stmt = (
+            select(Expense.category, total, db.func.count(1).label("count"))
+            .where(*_period_filter(user_phone, period))
             .group_by(Expense.category)
-            .all()
+            .order_by(total.desc())
         )
 
         return [
-            {"category": r.category if hasattr(r, "category") else r[0], "total": float(r.total), "count": int(r.count)}
-            for r in results
+            {"category": category, "total": float(total), "count": int(count)}
+            for category, total, count in db.session.execute(stmt)
         ]
 
     @staticmethod
@@ -119,16 +281,18 @@ class ExpenseService:
         """
         Atualiza um gasto.
         """
-        expense = Expense.query.get(expense_id)
+        expense = db.session.get(Expense, expense_id)
         if not expense:
             return None
 
+        previous_category = expense.category
         for key, value in kwargs.items():
             if hasattr(expense, key):
                 setattr(expense, key, value)
 
         expense.updated_at = datetime.utcnow()
         db.session.commit()
+        ExpenseService.invalidate_user_cache(expense.user_phone, previous_category, expense.category)
         return expense
 
     @staticmethod
@@ -136,53 +300,63 @@ class ExpenseService:
         """
         Deleta um gasto validando o telefone do usuário.
         """
-        expense = Expense.query.filter(Expense.id == expense_id, Expense.user_phone == user_phone).first()
+        expense = db.session.execute(
+            select(Expense).where(Expense.id == expense_id, Expense.user_phone == user_phone)
+        ).scalar_one_or_none()
         if not expense:
             return False
 
         db.session.delete(expense)
         db.session.commit()
+        ExpenseService.invalidate_user_cache(user_phone, expense.category)
         return True
 
     @staticmethod
+    @cache.memoize(timeout=AGGREGATE_CACHE_TIMEOUT)
     def get_user_statistics(user_phone: str) -> Dict:
         """
         Retorna estatísticas do usuário.
         """
-        # Total geral (contagem de registros)
-        total_expenses = db.session.query(db.func.count(1)).filter(Expense.user_phone == user_phone).scalar() or 0
-        total_expenses = int(total_expenses)
-
-        # Soma total
-        total_amount = db.session.query(db.func.sum(Expense.amount)).filter(Expense.user_phone == user_phone).scalar() or 0.0
-        total_amount = float(total_amount)
-
-        # Totais por período (usa a versão agregada, mais performática)
-        today_total = ExpenseService.get_total_by_period(user_phone, "today")
-        week_total = ExpenseService.get_total_by_period(user_phone, "week")
-        month_total = ExpenseService.get_total_by_period(user_phone, "month")
+        # Limites dos períodos calculados uma vez; todos terminam no fim do dia atual
+        today_start, end_date = get_period_dates("today")
+        week_start, _ = get_period_dates("week")
+        month_start, _ = get_period_dates("month")
+
+        def period_sum(start_date):
+            return db.func.coalesce(
+                db.func.sum(case((Expense.created_at.between(start_date, end_date), Expense.amount), else_=0)),
+                0.0,
+            )
 
-        # Categoria mais usada
-        row = (
-            db.session.query(Expense.category, db.func.count(1).label("count"))
-            .filter(Expense.user_phone == user_phone)
+        # Categoria mais usada como subconsulta escalar da mesma instrução
+        most_used_category = (
+            select(Expense.category)
+            .where(Expense.user_phone == user_phone)
             .group_by(Expense.category)
             .order_by(db.func.count(1).desc())
-            .first()
+            .limit(1)
+            .scalar_subquery()
         )
 
-        most_used_category_name = None
-        if row:
-            # row pode ser KeyedTuple com atributo 'category' ou tupla => extrai com segurança
-            most_used_category_name = getattr(row, "category", None) or (row[0] if len(row) > 0 else None)
+        # Uma única consulta com agregação condicional
+        row = db.session.execute(
+            select(
+                db.func.count(1).label("total_expenses"),
+                db.func.coalesce(db.func.sum(Expense.amount), 0.0).label("total_amount"),
+                period_sum(today_start).label("today_total"),
+                period_sum(week_start).label("week_total"),
+                period_sum(month_start).label("month_total"),
+                most_used_category.label("most_used_category"),
+            ).where(Expense.user_phone == user_phone)
+        ).one()
 
         return {
-            "total_expenses": total_expenses,
-            "total_amount": float(total_amount),
-            "today_total": float(today_total),
-            "week_total": float(week_total),
-            "month_total": float(month_total),
-            "most_used_category": most_used_category_name,
+            "total_expenses": int(row.total_expenses),
+            "total_amount": float(row.total_amount),
+            "today_total": float(row.today_total),
+            "week_total": float(row.week_total),
+            "month_total": float(row.month_total),
+            "most_used_category": row.most_used_category,
         }
 
 
@@ -225,7 +399,9 @@ class UserSettingsService:
     @staticmethod
     def get_or_create_settings(user_phone: str) -> UserSettings:
         """Retorna ou cria configurações do usuário."""
-        settings = UserSettings.query.filter_by(user_phone=user_phone).first()
+        settings = db.session.execute(
+            select(UserSettings).where(UserSettings.user_phone == user_phone)
+        ).scalar_one_or_none()
         if not settings:
             settings = UserSettings(user_phone=user_phone)
             db.session.add(settings)
@@ -1,10 +1,31 @@
 """
 Funções auxiliares para o projeto.
 """
+import math
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 from typing import Dict, Any, Optional
 
+# Expressões regulares compiladas uma única vez
+_CURRENCY_RE = re.compile(r'[^\d,.]')
+_DIGITS_RE = re.compile(r'\D')
+_CTRL_RE = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+# Emojis das categorias (chaves já em minúsculas)
+_EMOJI_MAP = {
+    'alimentação': '🍽️',
+    'transporte': '🚗',
+    'combustível': '⛽',
+    'saúde': '🏥',
+    'educação': '📚',
+    'lazer': '🎬',
+    'casa': '🏠',
+    'roupas': '👕',
+    'outros': '📦'
+}
+_DEFAULT_EMOJI = '📦'
+
 def format_currency(amount: float) -> str:
     """
     Formata um valor monetário para exibição.
@@ -15,7 +36,12 @@ def format_currency(amount: float) -> str:
     Returns:
         str: Valor formatado (ex: "R$ 50,00")
     """
-    return f"R$ {amount:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    # inf/nan (ex.: valores com centenas de dígitos) não têm parte decimal
+    if not math.isfinite(amount):
+        return f"R$ {amount}"
+    
+    integer_part, decimal_part = f"{amount:,.2f}".split('.')
+    return f"R$ {integer_part.replace(',', '.')},{decimal_part}"
 
 def parse_currency(currency_str: str) -> Optional[float]:
     """
@@ -28,7 +54,7 @@ def parse_currency(currency_str: str) -> Optional[float]:
         Optional[float]: Valor convertido ou None se inválido
     """
     # Remove caracteres não numéricos exceto vírgula e ponto
-    cleaned = re.sub(r'[^\d,.]', '', currency_str)
+    cleaned = _CURRENCY_RE.sub('', currency_str)
     
     if not cleaned:
         return None
@@ -85,34 +111,33 @@ def get_period_dates(period: str) -> tuple[datetime, datetime]:
     Returns:
         tuple[datetime, datetime]: (data_inicio, data_fim)
     """
-    now = datetime.now()
-    
-    if period == 'today':
-        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-    elif period == 'yesterday':
-        yesterday = now - timedelta(days=1)
-        start = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-        end = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
-    elif period == 'week':
-        # Início da semana (segunda-feira)
-        days_since_monday = now.weekday()
-        start = (now - timedelta(days=days_since_monday)).replace(hour=0, minute=0, second=0, microsecond=0)
-        end = now
-    elif period == 'month':
-        # Início do mês
-        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end = now
-    elif period == 'year':
-        # Início do ano
-        start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        end = now
-    else:  # 'all' ou qualquer outro valor
-        # Desde o início dos tempos até agora
-        start = datetime(1900, 1, 1)
-        end = now
-    
-    return start, end
+    return _period_dates(period, date.today())
+
+# Limites de cada período a partir do início e do fim do dia atual
+_PERIOD_BOUNDS = {
+    'today': lambda start, end: (start, end),
+    'yesterday': lambda start, end: (start - timedelta(days=1), end - timedelta(days=1)),
+    # Início da semana (segunda-feira)
+    'week': lambda start, end: (start - timedelta(days=start.weekday()), end),
+    'month': lambda start, end: (start.replace(day=1), end),
+    'year': lambda start, end: (start.replace(month=1, day=1), end),
+}
+
+def _all_time_bounds(start: datetime, end: datetime) -> tuple[datetime, datetime]:
+    """'all' ou qualquer outro valor: desde o início dos tempos até hoje."""
+    return datetime(1900, 1, 1), end
+
+@lru_cache(maxsize=64)
+def _period_dates(period: str, today: date) -> tuple[datetime, datetime]:
+    """
+    Calcula os limites do período para o dia informado.
+    
+    O dia faz parte da chave do cache, então os resultados expiram
+    naturalmente na virada do dia. Os períodos abertos terminam no fim
+    do dia atual.
+    """
+    bounds = _PERIOD_BOUNDS.get(period, _all_time_bounds)
+    return bounds(datetime.combine(today, time.min), datetime.combine(today, time.max))
 
 def validate_phone_number(phone: str) -> bool:
     """
@@ -125,7 +150,7 @@ def validate_phone_number(phone: str) -> bool:
         bool: True se válido, False caso contrário
     """
     # Remove caracteres não numéricos
-    cleaned = re.sub(r'\D', '', phone)
+    cleaned = _DIGITS_RE.sub('', phone)
     
     # Verifica se tem 10 ou 11 dígitos (com DDD)
     if len(cleaned) not in [10, 11]:
@@ -152,16 +177,12 @@ def sanitize_input(text: str, max_length: int = 500) -> str:
     if not text:
         return ""
     
-    # Remove caracteres de controle
-    sanitized = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-    
-    # Limita o comprimento
-    sanitized = sanitized[:max_length]
-    
-    # Remove espaços extras
-    sanitized = ' '.join(sanitized.split())
+    # Remove caracteres de controle; isprintable() varre o texto em C e
+    # dispensa a regex no caso comum de mensagens sem esses caracteres
+    sanitized = text if text.isprintable() else _CTRL_RE.sub('', text)
     
-    return sanitized.strip()
+    # Limita o comprimento e remove espaços extras (split/join já apara as pontas)
+    return ' '.join(sanitized[:max_length].split())
 
 def generate_response_message(message_type: str, data: Dict[str, Any]) -> str:
     """
@@ -227,6 +248,7 @@ Tente algo como:
     
     return "Mensagem processada."
 
+@lru_cache(maxsize=64)
 def get_emoji_for_category(category: str) -> str:
     """
     Retorna emoji apropriado para uma categoria.
@@ -237,17 +259,5 @@ def get_emoji_for_category(category: str) -> str:
     Returns:
         str: Emoji correspondente
     """
-    emoji_map = {
-        'alimentação': '🍽️',
-        'transporte': '🚗',
-        'combustível': '⛽',
-        'saúde': '🏥',
-        'educação': '📚',
-        'lazer': '🎬',
-        'casa': '🏠',
-        'roupas': '👕',
-        'outros': '📦'
-    }
-    
-    return emoji_map.get(category.lower(), '📦')
+    return _EMOJI_MAP.get(category.lower(), _DEFAULT_EMOJI)
 
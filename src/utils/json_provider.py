@@ -0,0 +1,36 @@
+"""
+Provider JSON do Flask baseado em orjson.
+"""
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Serializa as respostas com orjson.
+
+    Datas são serializadas nativamente pelo orjson (sem isoformat) e
+    modelos que expõem ``__json__`` podem ser retornados diretamente
+    pelas rotas, sem passar por ``to_dict``.
+    """
+
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_SORT_KEYS
+
+    @staticmethod
+    def _default(obj):
+        if hasattr(obj, '__json__'):
+            return obj.__json__()
+        return DefaultJSONProvider.default(obj)
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self._default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self._default, option=self.option | orjson.OPT_APPEND_NEWLINE),
+            mimetype=self.mimetype
+        )
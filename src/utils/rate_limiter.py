@@ -0,0 +1,70 @@
+"""
+Limitador de taxa do tipo token bucket.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Balde de fichas seguro entre threads.
+    
+    O balde começa cheio com `capacity` fichas e é reabastecido a `rate`
+    fichas por segundo; cada operação consome fichas antes de executar.
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        """
+        Inicializa o balde.
+        
+        Args:
+            rate (float): Fichas repostas por segundo
+            capacity (float): Quantidade máxima de fichas acumuladas
+            
+        Raises:
+            ValueError: Se a taxa não for positiva
+        """
+        if rate <= 0:
+            raise ValueError(f"A taxa do limitador deve ser positiva: {rate}")
+        
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def consume(self, tokens: float = 1, block: bool = True) -> bool:
+        """
+        Consome fichas do balde.
+        
+        Args:
+            tokens (float): Quantidade de fichas a consumir
+            block (bool): Se True, aguarda até haver fichas suficientes
+            
+        Returns:
+            bool: True se as fichas foram consumidas, False se não havia
+                  fichas e block=False
+            
+        Raises:
+            ValueError: Se o pedido for maior que a capacidade (nunca seria atendido)
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"Pedido de {tokens} fichas excede a capacidade {self.capacity}")
+        
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                
+                if not block:
+                    return False
+                
+                wait = (tokens - self._tokens) / self.rate
+            
+            # Dorme fora do lock para não bloquear as demais threads
+            time.sleep(wait)
@@ -2,12 +2,45 @@
 Cliente para interagir com a API do WhatsApp Business.
 """
 import requests
+import atexit
+import hashlib
+import io
 import logging
-from typing import Dict, Optional, Any
+import orjson
+import tempfile
+import threading
+import time
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import IO, Dict, Iterable, List, Optional, Any, Tuple
 from src.config.settings import Config
+from src.utils.rate_limiter import TokenBucket
 
 logger = logging.getLogger(__name__)
 
+# Espera máxima (segundos) ao respeitar o Retry-After de um 429
+MAX_RETRY_AFTER = 30
+
+# Os metadados trazem uma URL de download que a Meta expira em ~5 minutos,
+# então ficam em cache por menos tempo que os bytes já baixados
+MEDIA_INFO_CACHE_TTL = 240
+MEDIA_BYTES_CACHE_TTL = 900
+MEDIA_BYTES_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# Download de mídia em blocos; acima do limite o buffer vai para o disco
+MEDIA_CHUNK_SIZE = 64 * 1024
+MEDIA_SPOOL_MAX_SIZE = 2 * 1024 * 1024
+MEDIA_DOWNLOAD_TIMEOUT = 30
+
+# Confirmações de leitura acumuladas antes do envio: por tempo ou quantidade
+READ_FLUSH_INTERVAL = 0.2
+READ_FLUSH_MAX = 20
+
+# Envios simultâneos em send_bulk (todos pela mesma sessão e limite de taxa)
+BULK_SEND_WORKERS = 8
+
 class WhatsAppAPIClient:
     """Cliente para a API do WhatsApp Business."""
     
@@ -17,15 +50,54 @@ class WhatsAppAPIClient:
         self.access_token = Config.WHATSAPP_ACCESS_TOKEN
         self.phone_number_id = Config.WHATSAPP_PHONE_NUMBER_ID
         
-        if not all([self.base_url, self.access_token, self.phone_number_id]):
+        # As credenciais não mudam durante a vida do cliente
+        self._configured = all([self.base_url, self.access_token, self.phone_number_id])
+        if not self._configured:
             logger.warning("Configurações do WhatsApp não estão completas")
-    
-    def _get_headers(self) -> Dict[str, str]:
-        """Retorna os headers para as requisições."""
-        return {
+        
+        # Valores constantes montados uma vez, não a cada requisição
+        self._headers = {
             'Authorization': f'Bearer {self.access_token}',
             'Content-Type': 'application/json'
         }
+        self._messages_endpoint = f"{self.phone_number_id}/messages"
+        
+        # Sessão única: reaproveita conexões keep-alive (sem novo handshake TLS
+        # a cada chamada) e envia os headers configurados uma só vez.
+        # Por padrão o Retry só repete métodos idempotentes, então um POST de
+        # envio de mensagem nunca é duplicado.
+        self._session = requests.Session()
+        self._session.headers.update(self._headers)
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=50,
+            max_retries=Retry(total=3, backoff_factor=0.2,
+                              status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        
+        # Limita os envios de mensagens para não estourar a cota da Meta
+        # (a parte deste processo no limite total de WHATSAPP_SEND_RATE); com
+        # taxa fracionária o balde ainda precisa comportar um envio inteiro
+        send_rate = Config.WHATSAPP_SEND_RATE_PER_PROCESS
+        self._send_bucket = TokenBucket(rate=send_rate, capacity=max(1.0, send_rate))
+        
+        # Evita repetir chamadas à Graph API para a mesma mídia (reenvios,
+        # reprocessamentos); os bytes são limitados pelo tamanho total e só
+        # arquivos pequenos (que cabem em memória) são armazenados
+        self._media_info_cache = TTLCache(maxsize=1024, ttl=MEDIA_INFO_CACHE_TTL)
+        self._media_bytes_cache = TTLCache(maxsize=MEDIA_BYTES_CACHE_MAX_SIZE,
+                                           ttl=MEDIA_BYTES_CACHE_TTL, getsizeof=len)
+        self._media_cache_lock = threading.Lock()
+        
+        # Executor compartilhado pelos envios em lote, criado sob demanda
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        
+        # Confirmações de leitura pendentes: conversa -> (timestamp, message_id)
+        self._read_buffer = {}
+        self._read_lock = threading.Lock()
+        self._read_timer = None
+        atexit.register(self.flush_reads)
     
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
         """
@@ -40,16 +112,24 @@ class WhatsAppAPIClient:
             Dict: Resposta da API
         """
         url = f"{self.base_url}/{endpoint}"
-        headers = self._get_headers()
         
         try:
             if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, params=data)
+                kwargs = {'params': data}
             elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers, json=data)
+                # Corpo serializado com orjson; o Content-Type já está na sessão
+                kwargs = {'data': orjson.dumps(data)}
             else:
                 raise ValueError(f"Método HTTP não suportado: {method}")
             
+            response = self._session.request(method.upper(), url, **kwargs)
+            
+            # Um 429 significa que a requisição não foi processada: aguarda o
+            # Retry-After indicado pela API e tenta mais uma vez
+            if response.status_code == 429:
+                time.sleep(self._retry_after(response))
+                response = self._session.request(method.upper(), url, **kwargs)
+            
             response.raise_for_status()
             return response.json()
             
@@ -59,6 +139,19 @@ class WhatsAppAPIClient:
                 logger.error(f"Resposta da API: {e.response.text}")
             raise
     
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        """Retorna a espera indicada no header Retry-After, limitada a MAX_RETRY_AFTER."""
+        try:
+            return min(max(float(response.headers.get('Retry-After', 1)), 0), MAX_RETRY_AFTER)
+        except ValueError:
+            return 1
+    
+    def _send(self, data: Dict) -> Dict:
+        """Envia uma mensagem respeitando o limite de taxa."""
+        self._send_bucket.consume(1, block=True)
+        return self._make_request('POST', self._messages_endpoint, data)
+    
     def send_text_message(self, to: str, message: str) -> Dict:
         """
         Envia uma mensagem de texto.
@@ -70,8 +163,6 @@ class WhatsAppAPIClient:
         Returns:
             Dict: Resposta da API
         """
-        endpoint = f"{self.phone_number_id}/messages"
-        
         data = {
             "messaging_product": "whatsapp",
             "to": to,
@@ -82,7 +173,41 @@ class WhatsAppAPIClient:
         }
         
         logger.info(f"Enviando mensagem para {to}: {message[:50]}...")
-        return self._make_request('POST', endpoint, data)
+        return self._send(data)
+    
+    def send_bulk(self, items: Iterable[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """
+        Envia várias mensagens de texto em paralelo.
+        
+        Os envios compartilham a sessão (pool de conexões) e o limite de taxa.
+        
+        Args:
+            items (Iterable[Tuple[str, str]]): Pares (destinatário, texto)
+            
+        Returns:
+            List[Optional[Dict]]: Resposta da API de cada envio, na ordem de
+                                  entrada; None para os envios que falharam
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(self.send_text_message, to, message) for to, message in items]
+        
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Erro em envio em lote: {str(e)}")
+                results.append(None)
+        return results
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Retorna o executor dos envios em lote, criando-o na primeira chamada."""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=BULK_SEND_WORKERS,
+                                                        thread_name_prefix='whatsapp-send')
+        return self._executor
     
     def send_template_message(self, to: str, template_name: str, 
                             language_code: str = 'pt_BR', 
@@ -99,8 +224,6 @@ class WhatsAppAPIClient:
         Returns:
             Dict: Resposta da API
         """
-        endpoint = f"{self.phone_number_id}/messages"
-        
         template_data = {
             "name": template_name,
             "language": {
@@ -126,7 +249,7 @@ class WhatsAppAPIClient:
         }
         
         logger.info(f"Enviando template {template_name} para {to}")
-        return self._make_request('POST', endpoint, data)
+        return self._send(data)
     
     def send_interactive_message(self, to: str, header: str, body: str, 
                                buttons: list) -> Dict:
@@ -142,17 +265,11 @@ class WhatsAppAPIClient:
         Returns:
             Dict: Resposta da API
         """
-        endpoint = f"{self.phone_number_id}/messages"
-        
-        interactive_buttons = []
-        for i, button in enumerate(buttons[:3]):  # Máximo 3 botões
-            interactive_buttons.append({
-                "type": "reply",
-                "reply": {
-                    "id": f"button_{i}",
-                    "title": button[:20]  # Máximo 20 caracteres
-                }
-            })
+        # Máximo 3 botões, com título de até 20 caracteres
+        interactive_buttons = [
+            {"type": "reply", "reply": {"id": f"button_{i}", "title": button[:20]}}
+            for i, button in enumerate(buttons[:3])
+        ]
         
         data = {
             "messaging_product": "whatsapp",
@@ -174,7 +291,7 @@ class WhatsAppAPIClient:
         }
         
         logger.info(f"Enviando mensagem interativa para {to}")
-        return self._make_request('POST', endpoint, data)
+        return self._send(data)
     
     def mark_message_as_read(self, message_id: str) -> Dict:
         """
@@ -186,15 +303,65 @@ class WhatsAppAPIClient:
         Returns:
             Dict: Resposta da API
         """
-        endpoint = f"{self.phone_number_id}/messages"
-        
         data = {
             "messaging_product": "whatsapp",
             "status": "read",
             "message_id": message_id
         }
         
-        return self._make_request('POST', endpoint, data)
+        return self._make_request('POST', self._messages_endpoint, data)
+    
+    def queue_mark_as_read(self, message_id: str, chat_id: Optional[str] = None,
+                           timestamp: Optional[str] = None) -> None:
+        """
+        Agenda a confirmação de leitura de uma mensagem, sem bloquear.
+        
+        As confirmações são acumuladas e enviadas juntas a cada
+        READ_FLUSH_INTERVAL segundos (ou ao atingir READ_FLUSH_MAX). Marcar uma
+        mensagem como lida marca também as anteriores da conversa, então só a
+        mais recente de cada conversa é enviada.
+        
+        Args:
+            message_id (str): ID da mensagem
+            chat_id (str, optional): Número de quem enviou a mensagem
+            timestamp (str, optional): Timestamp da mensagem (epoch em segundos)
+        """
+        key = chat_id or message_id
+        order = int(timestamp) if timestamp and str(timestamp).isdigit() else 0
+        
+        with self._read_lock:
+            current = self._read_buffer.get(key)
+            if current is None or order >= current[0]:
+                self._read_buffer[key] = (order, message_id)
+            
+            if len(self._read_buffer) >= READ_FLUSH_MAX:
+                delay = 0
+            elif self._read_timer is None:
+                delay = READ_FLUSH_INTERVAL
+            else:
+                return
+            
+            if self._read_timer is not None:
+                self._read_timer.cancel()
+            self._read_timer = threading.Timer(delay, self.flush_reads)
+            self._read_timer.daemon = True
+            self._read_timer.start()
+    
+    def flush_reads(self) -> None:
+        """Envia as confirmações de leitura pendentes pela sessão compartilhada."""
+        with self._read_lock:
+            pending = self._read_buffer
+            self._read_buffer = {}
+            if self._read_timer is not None:
+                self._read_timer.cancel()
+                self._read_timer = None
+        
+        for _, message_id in pending.values():
+            try:
+                self.mark_message_as_read(message_id)
+                logger.info(f"Mensagem {message_id} marcada como lida")
+            except Exception as e:
+                logger.error(f"Erro ao marcar mensagem como lida: {str(e)}")
     
     def get_media(self, media_id: str) -> Dict:
         """
@@ -206,28 +373,75 @@ class WhatsAppAPIClient:
         Returns:
             Dict: Informações do arquivo
         """
-        endpoint = media_id
-        return self._make_request('GET', endpoint)
+        with self._media_cache_lock:
+            info = self._media_info_cache.get(media_id)
+        if info is not None:
+            return info
+        
+        info = self._make_request('GET', media_id)
+        with self._media_cache_lock:
+            self._media_info_cache[media_id] = info
+        return info
     
-    def download_media(self, media_url: str) -> bytes:
+    def download_media(self, media_url: str) -> IO[bytes]:
         """
-        Baixa um arquivo de mídia.
+        Baixa um arquivo de mídia em blocos, sem carregar a resposta inteira.
+        
+        Arquivos pequenos ficam em memória; acima de MEDIA_SPOOL_MAX_SIZE o
+        conteúdo vai para um arquivo temporário em disco.
         
         Args:
             media_url (str): URL do arquivo
             
         Returns:
-            bytes: Conteúdo do arquivo
+            IO[bytes]: Arquivo posicionado no início; quem chama deve fechá-lo
         """
-        headers = self._get_headers()
+        key = hashlib.blake2b(media_url.encode()).digest()
+        with self._media_cache_lock:
+            content = self._media_bytes_cache.get(key)
+        if content is not None:
+            return io.BytesIO(content)
         
+        buffer = tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_MAX_SIZE)
         try:
-            response = requests.get(media_url, headers=headers)
-            response.raise_for_status()
-            return response.content
+            with self._session.get(media_url, stream=True, timeout=MEDIA_DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=MEDIA_CHUNK_SIZE):
+                    buffer.write(chunk)
         except requests.exceptions.RequestException as e:
+            buffer.close()
             logger.error(f"Erro ao baixar mídia: {str(e)}")
             raise
+        
+        # Só guarda no cache o que coube em memória
+        if buffer.tell() <= MEDIA_SPOOL_MAX_SIZE:
+            buffer.seek(0)
+            content = buffer.read()
+            with self._media_cache_lock:
+                self._media_bytes_cache[key] = content
+        
+        buffer.seek(0)
+        return buffer
+    
+    def invalidate_media(self, media_id: str) -> None:
+        """
+        Remove do cache os metadados e o conteúdo de uma mídia.
+        
+        Args:
+            media_id (str): ID do arquivo de mídia
+        """
+        with self._media_cache_lock:
+            info = self._media_info_cache.pop(media_id, None)
+            if info and info.get('url'):
+                self._media_bytes_cache.pop(hashlib.blake2b(info['url'].encode()).digest(), None)
+    
+    def close(self) -> None:
+        """Envia as leituras pendentes, encerra o executor e fecha a sessão HTTP."""
+        self.flush_reads()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._session.close()
     
     def is_configured(self) -> bool:
         """
@@ -236,11 +450,7 @@ class WhatsAppAPIClient:
         Returns:
             bool: True se configurado, False caso contrário
         """
-        return all([
-            self.base_url,
-            self.access_token,
-            self.phone_number_id
-        ])
+        return self._configured
     
     def test_connection(self) -> bool:
         """
@@ -0,0 +1,118 @@
+"""
+Fila de processamento das mensagens recebidas pelo webhook.
+
+As chamadas à API do WhatsApp (marcar como lida, responder) são bloqueantes;
+executá-las em threads de fundo permite que o webhook responda 200 na hora.
+
+Cada remetente é sempre atendido pelo mesmo worker (uma fila por worker), de
+modo que mensagens seguidas de um usuário são processadas e respondidas em
+ordem. No encerramento do processo as filas são esvaziadas antes de sair: a
+Meta já recebeu o 200 e não reenviaria as mensagens pendentes.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from flask import current_app
+from src.config.settings import Config
+from src.whatsapp.message_handler import MessageHandler
+
+logger = logging.getLogger(__name__)
+
+_queues = []
+_workers = []
+_workers_lock = threading.Lock()
+_closed = False
+
+def _worker(work_queue):
+    """Consome a fila do worker processando cada mensagem dentro do contexto da aplicação."""
+    while True:
+        app, message, value = work_queue.get()
+        try:
+            _process(app, message, value)
+        finally:
+            work_queue.task_done()
+
+def _process(app, message, value):
+    """Processa uma mensagem dentro do contexto da aplicação."""
+    try:
+        with app.app_context():
+            MessageHandler.handle_incoming_message(message, value)
+    except Exception as e:
+        logger.error(f"Erro no processamento em segundo plano: {str(e)}")
+
+def _ensure_workers():
+    """Inicia os workers na primeira mensagem (e não na importação do módulo)."""
+    if _workers:
+        return
+
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(max(1, Config.WEBHOOK_WORKERS)):
+            work_queue = queue.Queue()
+            thread = threading.Thread(target=_worker, args=(work_queue,),
+                                      name=f'webhook-worker-{i}', daemon=True)
+            thread.start()
+            _queues.append(work_queue)
+            _workers.append(thread)
+
+def submit(message, value):
+    """
+    Enfileira uma mensagem recebida para processamento em segundo plano.
+
+    Deve ser chamado dentro de uma requisição: o app atual é levado junto
+    para que o worker tenha acesso ao banco de dados. Durante o encerramento
+    a mensagem é processada na própria requisição, para não se perder.
+
+    Args:
+        message (Dict): Dados da mensagem
+        value (Dict): Dados do webhook
+    """
+    app = current_app._get_current_object()
+    if _closed:
+        _process(app, message, value)
+        return
+
+    _ensure_workers()
+    # Mesmo remetente, mesma fila: preserva a ordem das mensagens do usuário
+    work_queue = _queues[hash(message.get('from')) % len(_queues)]
+    work_queue.put_nowait((app, message, value))
+
+def drain(timeout=None):
+    """
+    Para de aceitar mensagens em segundo plano e aguarda as filas esvaziarem.
+
+    Args:
+        timeout (float, optional): Tempo máximo de espera em segundos
+            (padrão: Config.WEBHOOK_DRAIN_TIMEOUT)
+
+    Returns:
+        int: Quantidade de mensagens que ficaram sem processar
+    """
+    global _closed
+    _closed = True
+
+    deadline = time.monotonic() + (Config.WEBHOOK_DRAIN_TIMEOUT if timeout is None else timeout)
+    for work_queue in _queues:
+        # Equivalente a work_queue.join() com limite de tempo
+        with work_queue.all_tasks_done:
+            while work_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                work_queue.all_tasks_done.wait(remaining)
+
+    pending = sum(work_queue.unfinished_tasks for work_queue in _queues)
+    if pending:
+        logger.warning(f"Encerrando com {pending} mensagem(ns) do webhook sem processar")
+
+    # Confirmações de leitura enfileiradas pelas últimas mensagens
+    client = MessageHandler._whatsapp_client
+    if client is not None:
+        client.flush_reads()
+
+    return pending
+
+atexit.register(drain)
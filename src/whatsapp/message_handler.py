@@ -2,33 +2,49 @@
 Manipulador de mensagens do WhatsApp.
 """
 import logging
-from typing import Dict, Any, Optional
-from src.nlp.message_processor import MessageProcessor
+import threading
+from typing import Dict, Any, Iterable, Optional
+from src.nlp.message_processor import MessageProcessor, get_processor
 from src.services.expense_service import ExpenseService, CategoryService, UserSettingsService
 from src.whatsapp.api_client import WhatsAppAPIClient
 from src.utils.helpers import generate_response_message, format_currency, get_emoji_for_category
 
 logger = logging.getLogger(__name__)
 
+# Comandos especiais reconhecidos no texto (comparados em minúsculas)
+_HELP_CMDS = frozenset({'ajuda', 'help', '/help', '/ajuda'})
+_STATS_CMDS = frozenset({'estatisticas', 'stats', '/stats'})
+
+# Nomes dos períodos exibidos nos relatórios
+_PERIOD_NAMES = {
+    'today': 'hoje',
+    'yesterday': 'ontem',
+    'week': 'esta semana',
+    'month': 'este mês',
+    'year': 'este ano',
+    'all': 'total geral'
+}
+
 class MessageHandler:
     """Manipulador para processar mensagens do WhatsApp."""
     
-    # Instâncias dos serviços
-    _message_processor = None
+    # Instâncias dos serviços (o cliente é criado uma única vez, mesmo com
+    # vários workers do webhook chamando ao mesmo tempo)
     _whatsapp_client = None
+    _whatsapp_client_lock = threading.Lock()
     
     @classmethod
     def _get_message_processor(cls) -> MessageProcessor:
         """Retorna instância do processador de mensagens."""
-        if cls._message_processor is None:
-            cls._message_processor = MessageProcessor()
-        return cls._message_processor
+        return get_processor()
     
     @classmethod
     def _get_whatsapp_client(cls) -> WhatsAppAPIClient:
         """Retorna instância do cliente WhatsApp."""
         if cls._whatsapp_client is None:
-            cls._whatsapp_client = WhatsAppAPIClient()
+            with cls._whatsapp_client_lock:
+                if cls._whatsapp_client is None:
+                    cls._whatsapp_client = WhatsAppAPIClient()
         return cls._whatsapp_client
     
     @classmethod
@@ -54,7 +70,7 @@ class MessageHandler:
             logger.info(f"Processando mensagem {message_id} de {from_number}")
             
             # Marca a mensagem como lida
-            cls._mark_as_read(message_id)
+            cls._mark_as_read(message_id, from_number, timestamp)
             
             # Processa diferentes tipos de mensagem
             if message_type == 'text':
@@ -84,10 +100,11 @@ class MessageHandler:
         logger.info(f"Texto recebido: {text_body}")
         
         # Verifica comandos especiais
-        if text_body.lower() in ['ajuda', 'help', '/help', '/ajuda']:
+        command = text_body.lower()
+        if command in _HELP_CMDS:
             return cls._send_help_message(from_number)
         
-        if text_body.lower() in ['estatisticas', 'stats', '/stats']:
+        if command in _STATS_CMDS:
             return cls._send_statistics(from_number)
         
         # Processa a mensagem com NLP
@@ -158,40 +175,31 @@ class MessageHandler:
             total = ExpenseService.get_total_by_period(from_number, period, category)
             
             # Gera mensagem de relatório
-            period_names = {
-                'today': 'hoje',
-                'yesterday': 'ontem',
-                'week': 'esta semana',
-                'month': 'este mês',
-                'year': 'este ano',
-                'all': 'total geral'
-            }
-            
-            period_name = period_names.get(period, period)
+            period_name = _PERIOD_NAMES.get(period, period)
             
             if category and category != 'outros':
-                category_name = category.title()
-                emoji = get_emoji_for_category(category)
-                response_text = f"{emoji} *Relatório {category_name}*\n"
+                header = f"{get_emoji_for_category(category)} *Relatório {category.title()}*"
             else:
-                response_text = "📊 *Relatório Geral*\n"
+                header = "📊 *Relatório Geral*"
             
-            response_text += f"Período: {period_name}\n"
-            response_text += f"Total gasto: {format_currency(total)}"
+            # Monta as linhas numa lista e junta uma vez só no final
+            parts = [header, f"Período: {period_name}", f"Total gasto: {format_currency(total)}"]
             
             # Se for relatório geral, adiciona resumo por categoria
             if not category or category == 'outros':
                 summary = ExpenseService.get_category_summary(from_number, period)
                 if summary:
-                    response_text += "\n\n*Por categoria:*"
-                    for item in summary[:5]:  # Máximo 5 categorias
-                        emoji = get_emoji_for_category(item['category'])
-                        response_text += f"\n{emoji} {item['category'].title()}: {format_currency(item['total'])}"
+                    parts.extend(("", "*Por categoria:*"))
+                    parts.extend(
+                        f"{get_emoji_for_category(item['category'])} {item['category'].title()}: "
+                        f"{format_currency(item['total'])}"
+                        for item in summary[:5]  # Máximo 5 categorias
+                    )
                     
                     if len(summary) > 5:
-                        response_text += f"\n... e mais {len(summary) - 5} categorias"
+                        parts.append(f"... e mais {len(summary) - 5} categorias")
             
-            return cls._send_text_message(from_number, response_text)
+            return cls._send_text_message(from_number, "\n".join(parts))
             
         except Exception as e:
             logger.error(f"Erro ao gerar relatório: {str(e)}")
@@ -243,18 +251,23 @@ class MessageHandler:
         try:
             stats = ExpenseService.get_user_statistics(from_number)
             
-            response_text = "📈 *Suas Estatísticas*\n\n"
-            response_text += f"💰 Total gasto: {format_currency(stats['total_amount'])}\n"
-            response_text += f"📝 Total de gastos: {stats['total_expenses']}\n\n"
-            response_text += f"🗓️ Hoje: {format_currency(stats['today_total'])}\n"
-            response_text += f"📅 Esta semana: {format_currency(stats['week_total'])}\n"
-            response_text += f"📆 Este mês: {format_currency(stats['month_total'])}\n"
+            parts = [
+                "📈 *Suas Estatísticas*",
+                "",
+                f"💰 Total gasto: {format_currency(stats['total_amount'])}",
+                f"📝 Total de gastos: {stats['total_expenses']}",
+                "",
+                f"🗓️ Hoje: {format_currency(stats['today_total'])}",
+                f"📅 Esta semana: {format_currency(stats['week_total'])}",
+                f"📆 Este mês: {format_currency(stats['month_total'])}",
+                "",
+            ]
             
             if stats['most_used_category']:
                 emoji = get_emoji_for_category(stats['most_used_category'])
-                response_text += f"\n{emoji} Categoria mais usada: {stats['most_used_category'].title()}"
+                parts.append(f"{emoji} Categoria mais usada: {stats['most_used_category'].title()}")
             
-            return cls._send_text_message(from_number, response_text)
+            return cls._send_text_message(from_number, "\n".join(parts))
             
         except Exception as e:
             logger.error(f"Erro ao gerar estatísticas: {str(e)}")
@@ -304,18 +317,39 @@ class MessageHandler:
             return None
     
     @classmethod
-    def _mark_as_read(cls, message_id: str) -> None:
-        """Marca mensagem como lida."""
+    def broadcast(cls, numbers: Iterable[str], text: str) -> int:
+        """
+        Envia o mesmo texto para vários números em paralelo.
         
-        try:
-            client = cls._get_whatsapp_client()
-            
-            if client.is_configured():
-                client.mark_message_as_read(message_id)
-                logger.info(f"Mensagem {message_id} marcada como lida")
+        Args:
+            numbers (Iterable[str]): Números dos destinatários
+            text (str): Texto da mensagem
             
-        except Exception as e:
-            logger.error(f"Erro ao marcar mensagem como lida: {str(e)}")
+        Returns:
+            int: Quantidade de mensagens enviadas com sucesso
+        """
+        numbers = list(numbers)
+        client = cls._get_whatsapp_client()
+        
+        if not client.is_configured():
+            logger.warning("Cliente WhatsApp não configurado - simulando envio em lote")
+            logger.info(f"Mensagem para {len(numbers)} números: {text}")
+            return len(numbers)
+        
+        results = client.send_bulk((number, text) for number in numbers)
+        sent = sum(result is not None for result in results)
+        logger.info(f"Envio em lote: {sent}/{len(numbers)} mensagens enviadas")
+        return sent
+    
+    @classmethod
+    def _mark_as_read(cls, message_id: str, from_number: Optional[str] = None,
+                      timestamp: Optional[str] = None) -> None:
+        """Marca mensagem como lida em segundo plano, sem atrasar a resposta."""
+        
+        client = cls._get_whatsapp_client()
+        if client.is_configured():
+            # O cliente agrupa as confirmações e as envia fora desta thread
+            client.queue_mark_as_read(message_id, from_number, timestamp)
     
     @classmethod
     def handle_message_status(cls, status: Dict[str, Any]) -> None:
@@ -1,10 +1,13 @@
 """
 Webhook para receber mensagens do WhatsApp.
 """
+import hmac
 import logging
+import orjson
 from flask import Blueprint, request, jsonify
 from src.config.settings import Config
 from src.whatsapp.message_handler import MessageHandler
+from src.whatsapp import dispatcher
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +16,40 @@ logger = logging.getLogger(__name__)
 # Blueprint para o webhook
 webhook_bp = Blueprint('webhook', __name__)
 
+# Token de verificação lido uma vez, já em bytes para o compare_digest
+_VERIFY_TOKEN = (Config.WHATSAPP_WEBHOOK_VERIFY_TOKEN or '').encode()
+
+def _parse_body():
+    """Decodifica o corpo JSON da requisição; retorna None se estiver vazio ou inválido."""
+    body = request.get_data(cache=False)
+    if not body:
+        return None
+    
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        logger.warning("Corpo da requisição não é um JSON válido")
+        return None
+
+def _dict_items(container, key):
+    """
+    Retorna os itens de uma lista do payload que são objetos JSON.
+    
+    Qualquer outro formato é ignorado: um 500 faria a Meta reenviar o lote
+    inteiro, processando de novo as mensagens já enfileiradas.
+    
+    Args:
+        container (Dict): Objeto que contém a lista
+        key (str): Nome do campo da lista
+        
+    Returns:
+        List[Dict]: Itens válidos (vazia se o campo não for uma lista)
+    """
+    items = container.get(key)
+    if not isinstance(items, list):
+        return []
+    return [item for item in items if isinstance(item, dict)]
+
 @webhook_bp.route('/webhook', methods=['GET'])
 def verify_webhook():
     """
@@ -25,10 +62,11 @@ def verify_webhook():
     token = request.args.get('hub.verify_token')
     challenge = request.args.get('hub.challenge')
     
-    logger.info(f"Verificação do webhook: mode={mode}, token={token}")
+    logger.info(f"Verificação do webhook: mode={mode}")
     
-    # Verifica se o token é válido
-    if mode == 'subscribe' and token == Config.WHATSAPP_WEBHOOK_VERIFY_TOKEN:
+    # Verifica se o token é válido (comparação em tempo constante)
+    if (mode == 'subscribe' and token and _VERIFY_TOKEN
+            and hmac.compare_digest(token.encode(), _VERIFY_TOKEN)):
         logger.info("Webhook verificado com sucesso")
         return challenge, 200
     else:
@@ -43,40 +81,44 @@ def handle_webhook():
     O WhatsApp envia uma requisição POST com os dados da mensagem.
     """
     try:
-        # Obtém os dados da requisição
-        data = request.get_json()
+        # Obtém os dados da requisição (orjson direto, sem guardar o corpo bruto)
+        data = _parse_body()
         
         if not data:
             logger.warning("Dados vazios recebidos no webhook")
             return jsonify({'status': 'error', 'message': 'No data received'}), 400
         
-        logger.info(f"Dados recebidos: {data}")
-        
-        # Verifica se há entradas na mensagem
-        if 'entry' not in data:
+        # Verifica se há entradas na mensagem (checagens baratas antes dos laços)
+        entries = data.get('entry') if isinstance(data, dict) else None
+        if not isinstance(entries, list):
             logger.warning("Formato de dados inválido - sem 'entry'")
             return jsonify({'status': 'ok'}), 200
         
+        # O payload completo só é formatado se o nível DEBUG estiver ativo
+        logger.debug("Webhook recebido (%d entradas): %s", len(entries), data)
+        
         # Processa cada entrada
-        for entry in data['entry']:
-            if 'changes' not in entry:
+        for entry in entries:
+            changes = entry.get('changes') if isinstance(entry, dict) else None
+            if not isinstance(changes, list):
                 continue
-                
-            for change in entry['changes']:
-                if change.get('field') != 'messages':
+            
+            for change in changes:
+                if not isinstance(change, dict) or change.get('field') != 'messages':
                     continue
                 
-                value = change.get('value', {})
+                value = change.get('value')
+                if not isinstance(value, dict):
+                    continue
                 
                 # Processa mensagens recebidas
-                if 'messages' in value:
-                    for message in value['messages']:
-                        MessageHandler.handle_incoming_message(message, value)
+                for message in _dict_items(value, 'messages'):
+                    # Responde 200 imediatamente; o envio ao WhatsApp fica com os workers
+                    dispatcher.submit(message, value)
                 
                 # Processa status de mensagens (entregue, lida, etc.)
-                if 'statuses' in value:
-                    for status in value['statuses']:
-                        MessageHandler.handle_message_status(status)
+                for status in _dict_items(value, 'statuses'):
+                    MessageHandler.handle_message_status(status)
         
         return jsonify({'status': 'ok'}), 200
         
@@ -90,7 +132,7 @@ def test_webhook():
     Endpoint para testar o processamento de mensagens localmente.
     """
     try:
-        data = request.get_json()
+        data = _parse_body()
         
         if not data or 'message' not in data or 'phone' not in data:
             return jsonify({
@@ -3,80 +3,119 @@
 Script de teste para o webhook do WhatsApp.
 """
 import requests
-import json
+import orjson
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 
 # Adiciona o diretório src ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+# Sessão única (keep-alive) para todas as chamadas; 127.0.0.1 evita a
+# resolução de 'localhost' (que pode tentar IPv6 antes) a cada requisição
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=8))
+
+# Casos de teste (criados uma única vez na importação). Rodam em ordem: o
+# relatório e as estatísticas dependem dos gastos criados pelos casos
+# anteriores; só os marcados como independentes vão em paralelo
+_WEBHOOK_CASES = (
+    {
+        "name": "Gasto simples",
+        "message": "Gastei 50 reais em alimentação",
+        "phone": "5511999999999"
+    },
+    {
+        "name": "Gasto com combustível",
+        "message": "Combustível 120",
+        "phone": "5511999999999"
+    },
+    {
+        "name": "Relatório",
+        "message": "Relatório alimentação",
+        "phone": "5511999999999"
+    },
+    {
+        "name": "Ajuda",
+        "message": "ajuda",
+        "phone": "5511999999999",
+        "independent": True
+    },
+    {
+        "name": "Estatísticas",
+        "message": "estatisticas",
+        "phone": "5511999999999"
+    }
+)
+
 def test_webhook_locally():
     """Testa o webhook localmente."""
     
-    base_url = "http://localhost:50001/api"
-    
-    # Casos de teste
-    test_cases = [
-        {
-            "name": "Gasto simples",
-            "message": "Gastei 50 reais em alimentação",
-            "phone": "5511999999999"
-        },
-        {
-            "name": "Gasto com combustível",
-            "message": "Combustível 120",
-            "phone": "5511999999999"
-        },
-        {
-            "name": "Relatório",
-            "message": "Relatório alimentação",
-            "phone": "5511999999999"
-        },
-        {
-            "name": "Ajuda",
-            "message": "ajuda",
-            "phone": "5511999999999"
-        },
-        {
-            "name": "Estatísticas",
-            "message": "estatisticas",
-            "phone": "5511999999999"
-        }
-    ]
+    base_url = "http://127.0.0.1:50001/api"
     
     print("=== TESTE DO WEBHOOK ===\n")
     
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"{i}. Testando: {test_case['name']}")
-        print(f"   Mensagem: '{test_case['message']}'")
-        
+    # Envia um caso pela sessão compartilhada
+    def _run(test_case):
         try:
-            response = requests.post(
+            return SESSION.post(
                 f"{base_url}/webhook/test",
                 json={
                     "message": test_case['message'],
                     "phone": test_case['phone']
                 },
-                headers={'Content-Type': 'application/json'},
                 timeout=10
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                print(f"   ✅ Sucesso: {data.get('message', 'OK')}")
-                if 'response' in data:
-                    print(f"   📱 Resposta: {data['response'][:100]}...")
-            else:
-                print(f"   ❌ Erro {response.status_code}: {response.text}")
-                
-        except requests.exceptions.ConnectionError:
-            print("   ❌ Erro: Servidor não está rodando. Execute 'python src/main.py' primeiro.")
-            return False
         except Exception as e:
-            print(f"   ❌ Erro: {str(e)}")
+            return e
+    
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # Casos independentes começam já, em paralelo com a sequência
+        independent = {
+            i: executor.submit(_run, test_case)
+            for i, test_case in enumerate(_WEBHOOK_CASES)
+            if test_case.get('independent')
+        }
         
-        print()
+        # Os demais são enviados um após o outro, na ordem original
+        for i, test_case in enumerate(_WEBHOOK_CASES):
+            response = independent[i].result() if i in independent else _run(test_case)
+            if not _print_result(i + 1, test_case, response):
+                return False
+    
+    return True
+
+def _print_result(number, test_case, response):
+    """
+    Exibe o resultado de um caso de teste.
+    
+    Returns:
+        bool: False se o servidor não estiver rodando
+    """
+    print(f"{number}. Testando: {test_case['name']}")
+    print(f"   Mensagem: '{test_case['message']}'")
+    
+    try:
+        if isinstance(response, Exception):
+            raise response
+        
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            print(f"   ✅ Sucesso: {data.get('message', 'OK')}")
+            if 'response' in data:
+                print(f"   📱 Resposta: {data['response'][:100]}...")
+        else:
+            print(f"   ❌ Erro {response.status_code}: {response.text}")
+            
+    except requests.exceptions.ConnectionError:
+        print("   ❌ Erro: Servidor não está rodando. Execute 'python src/main.py' primeiro.")
+        return False
+    except Exception as e:
+        print(f"   ❌ Erro: {str(e)}")
+    
+    print()
     
     return True
 
@@ -84,9 +123,9 @@ def test_health_check():
     """Testa o endpoint de health check."""
     
     try:
-        response = requests.get("http://localhost:5000/health", timeout=5)
+        response = SESSION.get("http://127.0.0.1:5000/health", timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             print(f"✅ Health Check OK: {data}")
             return True
         else:
@@ -0,0 +1,13 @@
+"""
+Configuração compartilhada dos testes (carregada uma vez pelo pytest).
+"""
+import os
+import sys
+
+# Raiz do projeto no path uma única vez, para todos os módulos de teste
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importa uma vez as dependências pesadas usadas pelos testes
+import src.models.expense  # noqa: E402,F401
+import src.nlp.message_processor  # noqa: E402,F401
+import src.services.expense_service  # noqa: E402,F401
@@ -0,0 +1,82 @@
+"""
+Testes para o cliente da API do WhatsApp.
+"""
+import threading
+import unittest
+from unittest import mock
+
+from src.config.settings import Config
+from src.whatsapp import dispatcher
+from src.whatsapp.api_client import WhatsAppAPIClient
+from src.whatsapp.message_handler import MessageHandler
+
+class TestWhatsAppAPIClient(unittest.TestCase):
+    """Testes para a classe WhatsAppAPIClient."""
+    
+    def setUp(self):
+        """Cria um cliente com as requisições à API substituídas por um mock."""
+        self.client = WhatsAppAPIClient()
+        self.addCleanup(self.client.close)
+        
+        patcher = mock.patch.object(self.client, '_make_request', return_value={'success': True})
+        self.make_request = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_fractional_send_rate_still_sends(self):
+        """Testa que uma taxa por processo abaixo de 1 msg/s não trava os envios."""
+        with mock.patch.object(Config, 'WHATSAPP_SEND_RATE_PER_PROCESS', 0.5):
+            client = WhatsAppAPIClient()
+        self.addCleanup(client.close)
+        
+        with mock.patch.object(client, '_make_request', return_value={'success': True}) as make_request, \
+             mock.patch('src.utils.rate_limiter.time.sleep') as sleep:
+            client.send_text_message('5511999999999', 'Olá')
+        
+        make_request.assert_called_once()
+        sleep.assert_not_called()
+        self.assertEqual(client._send_bucket.rate, 0.5)
+    
+    def _read_ids(self):
+        """IDs das mensagens marcadas como lidas pelas chamadas à API."""
+        return [call.args[2]['message_id'] for call in self.make_request.call_args_list]
+    
+    def test_queued_reads_keep_newest_per_chat(self):
+        """Testa que só a mensagem mais recente de cada conversa é marcada como lida."""
+        with mock.patch('src.whatsapp.api_client.threading.Timer'):
+            self.client.queue_mark_as_read('a1', chat_id='5511111111111', timestamp='100')
+            self.client.queue_mark_as_read('a3', chat_id='5511111111111', timestamp='300')
+            self.client.queue_mark_as_read('a2', chat_id='5511111111111', timestamp='200')
+            self.client.queue_mark_as_read('b1', chat_id='5522222222222', timestamp='150')
+        
+        self.make_request.assert_not_called()
+        self.client.flush_reads()
+        
+        self.assertCountEqual(self._read_ids(), ['a3', 'b1'])
+    
+    def test_timer_flushes_queued_reads(self):
+        """Testa que o timer envia as confirmações sem chamada explícita a flush_reads."""
+        sent = threading.Event()
+        self.make_request.side_effect = lambda *args: sent.set()
+        
+        with mock.patch('src.whatsapp.api_client.READ_FLUSH_INTERVAL', 0.01):
+            self.client.queue_mark_as_read('m1', chat_id='5511111111111', timestamp='100')
+        
+        self.assertTrue(sent.wait(2))
+        self.assertEqual(self._read_ids(), ['m1'])
+        self.assertIsNone(self.client._read_timer)
+    
+    def test_dispatcher_drain_flushes_queued_reads(self):
+        """Testa que o encerramento do dispatcher envia as confirmações pendentes."""
+        self.addCleanup(setattr, dispatcher, '_closed', False)
+        
+        with mock.patch('src.whatsapp.api_client.threading.Timer'), \
+             mock.patch.object(MessageHandler, '_whatsapp_client', self.client):
+            self.client.queue_mark_as_read('m1', chat_id='5511111111111', timestamp='100')
+            self.make_request.assert_not_called()
+            
+            dispatcher.drain(timeout=0)
+        
+        self.assertEqual(self._read_ids(), ['m1'])
+
+if __name__ == '__main__':
+    unittest.main()
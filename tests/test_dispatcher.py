@@ -0,0 +1,102 @@
+"""
+Testes para a fila de processamento do webhook.
+"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask
+from src.config.settings import Config
+from src.whatsapp import dispatcher
+
+class TestDispatcher(unittest.TestCase):
+    """Testes para o dispatcher de mensagens recebidas."""
+
+    def setUp(self):
+        """Usa filas e workers novos, com o processamento substituído por um mock."""
+        for name, value in (('_queues', []), ('_workers', []), ('_closed', False)):
+            patcher = mock.patch.object(dispatcher, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        workers = mock.patch.object(Config, 'WEBHOOK_WORKERS', 4)
+        workers.start()
+        self.addCleanup(workers.stop)
+
+        self.handled = []
+        self.release = threading.Event()
+        self.release.set()
+
+        handle = mock.patch('src.whatsapp.message_handler.MessageHandler.handle_incoming_message',
+                            side_effect=self._handle)
+        handle.start()
+        self.addCleanup(handle.stop)
+
+        app_context = Flask(__name__).app_context()
+        app_context.push()
+        self.addCleanup(app_context.pop)
+
+        # Roda antes de desfazer os mocks: nenhum worker deste teste fica ativo
+        self.addCleanup(self._finish_workers)
+
+    def _finish_workers(self):
+        """Libera o processamento e espera as filas deste teste esvaziarem."""
+        self.release.set()
+        for work_queue in dispatcher._queues:
+            work_queue.join()
+
+    def _handle(self, message, value):
+        """Registra a mensagem processada e a thread que a processou."""
+        self.release.wait(5)
+        # Tempos diferentes por mensagem: sem a fila por remetente a ordem embaralharia
+        time.sleep(0.001 * (hash(message['id']) % 5))
+        self.handled.append((message['from'], message['id'], threading.current_thread().name))
+
+    def _submit(self, sender, message_id):
+        """Enfileira uma mensagem mínima do remetente."""
+        dispatcher.submit({'from': sender, 'id': message_id}, {})
+
+    def test_same_sender_handled_in_order_on_one_worker(self):
+        """Testa que as mensagens de um remetente saem na ordem, sempre pelo mesmo worker."""
+        senders = [f'55119999900{n:02d}' for n in range(6)]
+        for i in range(10):
+            for sender in senders:
+                self._submit(sender, f'{sender}-{i:02d}')
+
+        self.assertEqual(dispatcher.drain(timeout=5), 0)
+        self.assertEqual(len(self.handled), 60)
+
+        for sender in senders:
+            with self.subTest(sender=sender):
+                ids = [message_id for who, message_id, _ in self.handled if who == sender]
+                threads = {thread for who, _, thread in self.handled if who == sender}
+                self.assertEqual(ids, sorted(ids))
+                self.assertEqual(len(threads), 1)
+
+    def test_drain_processes_queued_messages(self):
+        """Testa que o encerramento espera as mensagens ainda na fila."""
+        self.release.clear()
+        for i in range(3):
+            self._submit('5511999999999', f'm{i}')
+        self.assertEqual(self.handled, [])
+
+        threading.Timer(0.05, self.release.set).start()
+
+        self.assertEqual(dispatcher.drain(timeout=5), 0)
+        self.assertEqual([message_id for _, message_id, _ in self.handled], ['m0', 'm1', 'm2'])
+
+    def test_drain_timeout_reports_pending_and_later_messages_run_inline(self):
+        """Testa o limite de espera do encerramento e o processamento na própria requisição depois dele."""
+        self.release.clear()
+        for i in range(2):
+            self._submit('5511999999999', f'm{i}')
+
+        self.assertEqual(dispatcher.drain(timeout=0.05), 2)
+
+        self.release.set()
+        self._submit('5522222222222', 'depois')
+        self.assertIn(('5522222222222', 'depois', threading.current_thread().name), self.handled)
+
+if __name__ == '__main__':
+    unittest.main()
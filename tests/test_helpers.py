@@ -0,0 +1,33 @@
+"""
+Testes para as funções auxiliares.
+"""
+import unittest
+
+from src.utils.helpers import format_currency
+
+# Casos de teste (valor, esperado), criados uma única vez na importação
+_CURRENCY_CASES = (
+    (50.0, "R$ 50,00"),
+    (1234567.891, "R$ 1.234.567,89"),
+    (-1500.5, "R$ -1.500,50"),
+    (0.0, "R$ 0,00"),
+    (float('inf'), "R$ inf"),
+    (float('-inf'), "R$ -inf"),
+    (float('nan'), "R$ nan"),
+)
+
+class TestFormatCurrency(unittest.TestCase):
+    """Testes para format_currency."""
+    
+    def test_format_currency(self):
+        """Testa a formatação, inclusive valores não finitos (ex.: centenas de dígitos)."""
+        for amount, expected in _CURRENCY_CASES:
+            with self.subTest(amount=amount):
+                self.assertEqual(format_currency(amount), expected)
+    
+    def test_huge_parsed_amount(self):
+        """Testa que um valor com centenas de dígitos (float inf) não quebra a formatação."""
+        self.assertEqual(format_currency(float('9' * 400)), "R$ inf")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+"""
+Testes para o manipulador de mensagens do WhatsApp.
+"""
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from src.whatsapp.message_handler import MessageHandler
+
+class TestMessageHandler(unittest.TestCase):
+    """Testes para a classe MessageHandler."""
+    
+    def setUp(self):
+        """Começa sem cliente criado e restaura o original ao final."""
+        original = MessageHandler._whatsapp_client
+        self.addCleanup(setattr, MessageHandler, '_whatsapp_client', original)
+        MessageHandler._whatsapp_client = None
+    
+    def test_client_created_once_under_concurrency(self):
+        """Testa que workers simultâneos compartilham um único cliente."""
+        start = threading.Barrier(8)
+        
+        def slow_client():
+            time.sleep(0.05)
+            return object()
+        
+        def get_client():
+            start.wait()
+            return MessageHandler._get_whatsapp_client()
+        
+        with mock.patch('src.whatsapp.message_handler.WhatsAppAPIClient', side_effect=slow_client) as factory:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                clients = list(executor.map(lambda _: get_client(), range(8)))
+        
+        factory.assert_called_once()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+if __name__ == '__main__':
+    unittest.main()
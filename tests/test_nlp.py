@@ -2,20 +2,37 @@
 Testes para o módulo de processamento de linguagem natural.
 """
 import unittest
-import sys
-import os
-
-# Adiciona o diretório src ao path
-sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
 
 from src.nlp.message_processor import MessageProcessor
 
+# Casos de teste (mensagem, esperado), criados uma única vez na importação
+_AMOUNT_CASES = (
+    ("50 reais", 50.0),
+    ("R$ 85,50", 85.5),
+    ("120", 120.0),
+    ("25 pila", 25.0),
+    ("sem valor", None),
+)
+
+_CATEGORY_CASES = (
+    ("alimentação", "alimentação"),
+    ("combustível", "combustível"),
+    ("uber", "transporte"),
+    ("médico", "saúde"),
+    ("faculdade", "educação"),
+    ("cinema", "lazer"),
+    ("aluguel", "casa"),
+    ("camisa", "roupas"),
+    ("algo desconhecido", "outros"),
+)
+
 class TestMessageProcessor(unittest.TestCase):
     """Testes para a classe MessageProcessor."""
     
-    def setUp(self):
-        """Configura o teste."""
-        self.processor = MessageProcessor()
+    @classmethod
+    def setUpClass(cls):
+        """Cria um único processador para a classe (os testes só o leem)."""
+        cls.processor = MessageProcessor()
     
     def test_expense_message_simple(self):
         """Testa processamento de mensagem de gasto simples."""
@@ -69,36 +86,46 @@ class TestMessageProcessor(unittest.TestCase):
         
         self.assertEqual(result['type'], 'unknown')
     
+    def test_process_messages_batch(self):
+        """Testa processamento em lote mantendo a ordem das mensagens."""
+        messages = [
+            "Gastei 50 reais em alimentação",
+            "Olá, como vai?",
+            "Relatório transporte",
+            "Paguei 30 no almoço"
+        ]
+        results = self.processor.process_messages(messages)
+        
+        self.assertEqual(len(results), len(messages))
+        for message, result in zip(messages, results):
+            with self.subTest(message=message):
+                expected = self.processor.process_message(message)
+                expected.pop('timestamp')
+                result.pop('timestamp')
+                self.assertEqual(result, expected)
+    
+    def test_fast_mode_skips_spacy(self):
+        """Testa o modo rápido: sem palavra-chave, a categoria é 'outros' sem usar o spaCy."""
+        processor = MessageProcessor(fast_mode=True)
+        
+        result = processor.process_message("Paguei 40 reais na lojinha")
+        self.assertEqual(result['category'], 'outros')
+        self.assertEqual(processor.process_message("Paguei 30 no almoço")['category'], 'alimentação')
+        self.assertIsNone(processor._nlp)
+    
     def test_extract_amount(self):
         """Testa extração de valores monetários."""
-        test_cases = [
-            ("50 reais", 50.0),
-            ("R$ 85,50", 85.5),
-            ("120", 120.0),
-            ("25 pila", 25.0),
-            ("sem valor", None)
-        ]
+        # Todas as mensagens numa única varredura
+        results = self.processor.extract_amounts([message for message, _ in _AMOUNT_CASES])
         
-        for message, expected in test_cases:
+        for (message, expected), result in zip(_AMOUNT_CASES, results):
             with self.subTest(message=message):
-                result = self.processor._extract_amount(message)
                 self.assertEqual(result, expected)
+                self.assertEqual(self.processor._extract_amount(message), expected)
     
     def test_extract_category(self):
         """Testa extração de categorias."""
-        test_cases = [
-            ("alimentação", "alimentação"),
-            ("combustível", "combustível"),
-            ("uber", "transporte"),
-            ("médico", "saúde"),
-            ("faculdade", "educação"),
-            ("cinema", "lazer"),
-            ("aluguel", "casa"),
-            ("camisa", "roupas"),
-            ("algo desconhecido", "outros")
-        ]
-        
-        for message, expected in test_cases:
+        for message, expected in _CATEGORY_CASES:
             with self.subTest(message=message):
                 result = self.processor._extract_category(message)
                 self.assertEqual(result, expected)
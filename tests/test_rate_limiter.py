@@ -0,0 +1,52 @@
+"""
+Testes para o limitador de taxa.
+"""
+import unittest
+from unittest import mock
+
+from src.utils.rate_limiter import TokenBucket
+
+class TestTokenBucket(unittest.TestCase):
+    """Testes para a classe TokenBucket."""
+    
+    def test_consume_until_empty(self):
+        """Testa que o balde cheio libera `capacity` fichas sem esperar."""
+        bucket = TokenBucket(rate=1, capacity=3)
+        
+        for _ in range(3):
+            self.assertTrue(bucket.consume(block=False))
+        self.assertFalse(bucket.consume(block=False))
+    
+    def test_refill_over_time(self):
+        """Testa o reabastecimento proporcional ao tempo decorrido."""
+        with mock.patch('src.utils.rate_limiter.time.monotonic', return_value=100.0) as clock:
+            bucket = TokenBucket(rate=2, capacity=2)
+            self.assertTrue(bucket.consume(2, block=False))
+            self.assertFalse(bucket.consume(block=False))
+            
+            clock.return_value = 100.5
+            self.assertTrue(bucket.consume(block=False))
+            self.assertFalse(bucket.consume(block=False))
+    
+    def test_blocking_consume_waits(self):
+        """Testa que consume(block=True) dorme o tempo necessário."""
+        with mock.patch('src.utils.rate_limiter.time.monotonic', return_value=0.0) as clock, \
+             mock.patch('src.utils.rate_limiter.time.sleep') as sleep:
+            bucket = TokenBucket(rate=4, capacity=1)
+            bucket.consume()
+            
+            sleep.side_effect = lambda seconds: setattr(clock, 'return_value', clock.return_value + seconds)
+            self.assertTrue(bucket.consume())
+            sleep.assert_called_once_with(0.25)
+    
+    def test_rejects_requests_it_can_never_serve(self):
+        """Testa que taxa não positiva e pedido acima da capacidade falham na hora."""
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, capacity=1)
+        
+        bucket = TokenBucket(rate=0.5, capacity=0.5)
+        with self.assertRaises(ValueError):
+            bucket.consume()
+
+if __name__ == '__main__':
+    unittest.main()
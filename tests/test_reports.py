@@ -0,0 +1,187 @@
+"""
+Testes para as rotas de relatórios.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+from src.config.settings import Config
+from src.models.user import db
+from src.models.expense import Expense
+from src.routes.reports import reports_bp
+from src.services.cache import cache
+from src.services.expense_service import ExpenseService
+
+_app = None
+_app_context = None
+
+def setUpModule():
+    """Cria o app com as rotas de relatórios e o schema em memória uma única vez."""
+    global _app, _app_context
+
+    _app = Flask(__name__)
+    _app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    _app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    _app.config['TESTING'] = True
+    _app.config['CACHE_TYPE'] = 'SimpleCache'
+
+    db.init_app(_app)
+    cache.init_app(_app)
+    _app.register_blueprint(reports_bp, url_prefix='/api')
+
+    _app_context = _app.app_context()
+    _app_context.push()
+    db.create_all()
+
+def tearDownModule():
+    """Remove o schema e encerra o contexto da aplicação."""
+    db.session.remove()
+    db.drop_all()
+    _app_context.pop()
+
+def _fake_chart(*args):
+    """Substitui a renderização: grava um PNG mínimo no caminho recebido (último argumento)."""
+    path = args[-1]
+    with open(path, 'wb') as chart:
+        chart.write(b'\x89PNG fake')
+    return path
+
+class TestReportRoutes(unittest.TestCase):
+    """Testes para as rotas de relatórios."""
+
+    def setUp(self):
+        """Usa um diretório de gráficos próprio e um cliente de teste por teste."""
+        self.test_phone = "5511999999999"
+        self.client = _app.test_client()
+
+        self.chart_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.chart_dir, ignore_errors=True)
+        patcher = mock.patch.object(Config, 'CHART_CACHE_DIR', self.chart_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Remove os gastos criados e limpa o cache dos agregados."""
+        db.session.execute(db.delete(Expense))
+        db.session.commit()
+        cache.clear()
+
+    def _add_expense(self, amount=50.0):
+        """Cria um gasto do usuário de teste."""
+        return ExpenseService.create_expense(self.test_phone, {'amount': amount, 'category': 'alimentação'})
+
+    def _cached_charts(self):
+        """Lista os PNGs gravados no cache de gráficos."""
+        return [name for name in os.listdir(self.chart_dir) if name.endswith('.png')]
+
+    def test_extra_query_params_reuse_cached_chart(self):
+        """Testa que parâmetros desconhecidos não criam novas entradas no cache."""
+        self._add_expense()
+
+        with mock.patch('src.reports.report_generator.ReportGenerator.generate_category_chart',
+                        side_effect=_fake_chart) as render:
+            first = self.client.get(f'/api/reports/chart/category/{self.test_phone}?x=1')
+            second = self.client.get(f'/api/reports/chart/category/{self.test_phone}?x=2&period=month')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(len(self._cached_charts()), 1)
+
+    def test_invalid_period_is_rejected(self):
+        """Testa que um período desconhecido responde 400 sem renderizar nada."""
+        with mock.patch('src.reports.report_generator.ReportGenerator.generate_category_chart',
+                        side_effect=_fake_chart) as render:
+            response = self.client.get(f'/api/reports/chart/category/{self.test_phone}?period=bogus')
+
+        self.assertEqual(response.status_code, 400)
+        render.assert_not_called()
+        self.assertEqual(self._cached_charts(), [])
+
+    def test_chart_without_data_is_not_cached(self):
+        """Testa que o gráfico de um usuário sem gastos não é gravado no cache."""
+        with mock.patch('src.reports.report_generator.ReportGenerator.generate_comparison_chart',
+                        side_effect=_fake_chart):
+            response = self.client.get('/api/reports/chart/comparison/5511000000000')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'\x89PNG fake')
+        self.assertEqual(self._cached_charts(), [])
+        self.assertEqual(os.listdir(self.chart_dir), [])
+
+    def test_if_none_match_returns_304(self):
+        """Testa que repetir a requisição com o ETag recebido responde 304 sem corpo."""
+        self._add_expense()
+        url = f'/api/reports/summary/{self.test_phone}'
+
+        first = self.client.get(url)
+        etag = first.headers['ETag']
+        second = self.client.get(url, headers={'If-None-Match': etag})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.headers['ETag'], etag)
+        self.assertEqual(second.data, b'')
+
+    def test_new_expense_changes_etag(self):
+        """Testa que um novo gasto muda o ETag e invalida o antigo."""
+        self._add_expense()
+        url = f'/api/reports/summary/{self.test_phone}'
+        old_etag = self.client.get(url).headers['ETag']
+
+        self._add_expense(20.0)
+        response = self.client.get(url, headers={'If-None-Match': old_etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], old_etag)
+
+    def test_error_responses_have_no_etag(self):
+        """Testa que respostas de erro (400, 404 e 500) não levam ETag."""
+        with mock.patch('src.reports.report_generator.ReportGenerator.generate_category_chart',
+                        return_value=None):
+            not_found = self.client.get(f'/api/reports/chart/category/{self.test_phone}')
+        invalid = self.client.get(f'/api/reports/summary/{self.test_phone}?period=bogus')
+        with mock.patch('src.reports.report_generator.ReportGenerator.generate_expense_summary',
+                        side_effect=RuntimeError('falha')):
+            failed = self.client.get(f'/api/reports/summary/{self.test_phone}')
+
+        for response, status in ((not_found, 404), (invalid, 400), (failed, 500)):
+            with self.subTest(status=status):
+                self.assertEqual(response.status_code, status)
+                self.assertNotIn('ETag', response.headers)
+
+    def test_cached_chart_is_reused(self):
+        """Testa que o gráfico é renderizado uma vez e reaproveitado enquanto os dados não mudam."""
+        self._add_expense()
+        url = f'/api/reports/chart/timeline/{self.test_phone}'
+
+        with mock.patch('src.reports.report_generator.ReportGenerator.generate_timeline_chart',
+                        side_effect=_fake_chart) as render:
+            first = self.client.get(url)
+            second = self.client.get(url)
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(len(self._cached_charts()), 1)
+
+    def test_chart_rerendered_after_data_change(self):
+        """Testa que um novo gasto gera um novo gráfico em vez de servir o antigo."""
+        self._add_expense()
+        url = f'/api/reports/chart/timeline/{self.test_phone}'
+
+        with mock.patch('src.reports.report_generator.ReportGenerator.generate_timeline_chart',
+                        side_effect=_fake_chart) as render:
+            first = self.client.get(url)
+            self._add_expense(20.0)
+            second = self.client.get(url)
+
+        self.assertEqual(render.call_count, 2)
+        self.assertNotEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertEqual(len(self._cached_charts()), 2)
+
+if __name__ == '__main__':
+    unittest.main()
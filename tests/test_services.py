@@ -2,44 +2,101 @@
 Testes para os serviços da aplicação.
 """
 import unittest
-import sys
-import os
-from datetime import datetime
-
-# Adiciona o diretório src ao path
-sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
+from datetime import date, datetime
 
 from src.services.expense_service import ExpenseService, CategoryService
 from src.models.user import db
+from src.services.cache import cache
 from src.models.expense import Expense, Category
 from flask import Flask
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import scoped_session, sessionmaker
 
-class TestExpenseService(unittest.TestCase):
-    """Testes para ExpenseService."""
+_app_context = None
+
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    """Deixa o controle de transações com o SQLAlchemy (necessário para SAVEPOINT no SQLite)."""
+    dbapi_connection.isolation_level = None
+
+def _emit_begin(connection):
+    """Emite o BEGIN que o pysqlite deixou de emitir."""
+    connection.exec_driver_sql('BEGIN')
+
+def setUpModule():
+    """Cria o app, o schema em memória e as categorias padrão uma única vez."""
+    global _app_context
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+    app.config['CACHE_TYPE'] = 'SimpleCache'
+    
+    db.init_app(app)
+    cache.init_app(app)
+    
+    _app_context = app.app_context()
+    _app_context.push()
+    
+    event.listen(db.engine, 'connect', _disable_pysqlite_transactions)
+    event.listen(db.engine, 'begin', _emit_begin)
+    
+    db.create_all()
+    CategoryService.initialize_default_categories()
+
+def tearDownModule():
+    """Remove o schema e encerra o contexto da aplicação."""
+    db.session.remove()
+    db.drop_all()
+    _app_context.pop()
+
+def _seed_expenses(phone, rows):
+    """
+    Insere gastos de teste num único INSERT em lote e um único commit.
+    
+    Args:
+        phone (str): Telefone do usuário
+        rows (list): Tuplas (valor, categoria, descrição)
+    """
+    db.session.bulk_save_objects([
+        Expense(user_phone=phone, amount=amount, category=category, description=description,
+                confidence=1.0, original_message=description)
+        for amount, category, description in rows
+    ])
+    db.session.commit()
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Base que isola cada teste numa transação desfeita no tearDown.
+    
+    Os commits dos serviços viram SAVEPOINTs dentro dessa transação, então
+    o schema e as categorias padrão não precisam ser recriados a cada teste.
+    """
     
     def setUp(self):
-        """Configura o teste com banco em memória."""
-        self.app = Flask(__name__)
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-        self.app.config['TESTING'] = True
-        
-        db.init_app(self.app)
-        
-        with self.app.app_context():
-            db.create_all()
-            CategoryService.initialize_default_categories()
+        """Abre a transação externa e liga a sessão a ela."""
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
         
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-        
-        self.test_phone = "5511999999999"
+        self._module_session = db.session
+        db.session = scoped_session(sessionmaker(bind=self.connection,
+                                                 join_transaction_mode='create_savepoint'))
+        cache.clear()
     
     def tearDown(self):
-        """Limpa após o teste."""
+        """Desfaz tudo o que o teste gravou."""
         db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
+        db.session = self._module_session
+        self.transaction.rollback()
+        self.connection.close()
+
+class TestExpenseService(DatabaseTestCase):
+    """Testes para ExpenseService."""
+    
+    def setUp(self):
+        """Configura o teste com banco em memória."""
+        super().setUp()
+        self.test_phone = "5511999999999"
     
     def test_create_expense(self):
         """Testa criação de gasto."""
@@ -59,85 +116,229 @@ class TestExpenseService(unittest.TestCase):
         self.assertEqual(expense.category, 'alimentação')
         self.assertEqual(expense.description, 'Almoço')
     
+    def test_to_dict_matches_json_fields(self):
+        """Testa que to_dict usa os mesmos campos de __json__, com datas em ISO 8601."""
+        expense = ExpenseService.create_expense(self.test_phone, {'amount': 10.0, 'category': 'lazer'})
+        
+        fields, data = expense.__json__(), expense.to_dict()
+        
+        self.assertEqual(data.keys(), fields.keys())
+        self.assertEqual(data['created_at'], expense.created_at.isoformat())
+        self.assertEqual(data['amount'], 10.0)
+    
+    def test_create_expenses_bulk(self):
+        """Testa criação de vários gastos num único insert."""
+        message_datas = [
+            {'amount': 10.0, 'category': 'alimentação', 'description': 'Café'},
+            {'amount': 25.0, 'category': 'transporte', 'description': 'Uber'},
+        ]
+        
+        # Popula o cache para garantir que a inserção em lote o invalida
+        self.assertEqual(ExpenseService.get_total_by_period(self.test_phone, 'today'), 0.0)
+        
+        created = ExpenseService.create_expenses_bulk(self.test_phone, message_datas)
+        
+        self.assertEqual(created, 2)
+        self.assertEqual(ExpenseService.create_expenses_bulk(self.test_phone, []), 0)
+        self.assertAlmostEqual(ExpenseService.get_total_by_period(self.test_phone, 'today'), 35.0, places=6)
+        
+        expenses = ExpenseService.get_expenses_by_user(self.test_phone)
+        self.assertEqual({e.category for e in expenses}, {'alimentação', 'transporte'})
+        self.assertTrue(all(e.confidence == 1.0 for e in expenses))
+    
     def test_get_expenses_by_user(self):
         """Testa busca de gastos por usuário."""
         # Cria alguns gastos
-        for i in range(3):
-            message_data = {
-                'amount': 10.0 * (i + 1),
-                'category': 'alimentação',
-                'description': f'Gasto {i + 1}',
-                'confidence': 1.0,
-                'original_message': f'Gasto {i + 1}'
-            }
-            ExpenseService.create_expense(self.test_phone, message_data)
+        _seed_expenses(self.test_phone, [
+            (10.0 * (i + 1), 'alimentação', f'Gasto {i + 1}') for i in range(3)
+        ])
         
         expenses = ExpenseService.get_expenses_by_user(self.test_phone)
         
         self.assertEqual(len(expenses), 3)
-        # Verifica se estão ordenados por data (mais recente primeiro)
-        self.assertGreaterEqual(expenses[0].created_at, expenses[1].created_at)
+        # Mais recentes primeiro; datas iguais são desempatadas pelo id
+        ids = [expense.id for expense in expenses]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+    
+    def test_get_expenses_page_with_equal_timestamps(self):
+        """Testa que gastos criados no mesmo instante não se repetem entre páginas."""
+        # O lote grava o mesmo created_at em todas as linhas
+        ExpenseService.create_expenses_bulk(self.test_phone, [
+            {'amount': float(i + 1), 'category': 'alimentação'} for i in range(5)
+        ])
+        
+        pages = [ExpenseService.get_expenses_page(self.test_phone, 'today', page=page, per_page=2)
+                 for page in (1, 2, 3)]
+        ids = [expense.id for page in pages for expense in page.items]
+        
+        self.assertEqual(ids, sorted(set(ids), reverse=True))
+        self.assertEqual(len(ids), 5)
+    
+    def test_period_and_category_lists_break_ties_by_id(self):
+        """Testa que as listagens por período e categoria desempatam datas iguais pelo id."""
+        ExpenseService.create_expenses_bulk(self.test_phone, [
+            {'amount': float(i + 1), 'category': 'alimentação'} for i in range(4)
+        ])
+        
+        for expenses in (ExpenseService.get_expenses_by_period(self.test_phone, 'today'),
+                         ExpenseService.get_expenses_by_category(self.test_phone, 'alimentação')):
+            ids = [expense.id for expense in expenses]
+            self.assertEqual(ids, sorted(ids, reverse=True))
+        
+        rows = ExpenseService.get_expenses_by_period_rows(self.test_phone, 'today', limit=2)
+        self.assertEqual([row.amount for row in rows], [4.0, 3.0])
+    
+    def test_get_expenses_by_period_filters(self):
+        """Testa os filtros de categoria e o limite da listagem do período."""
+        _seed_expenses(self.test_phone, [
+            (10.0, 'alimentação', 'Almoço'),
+            (20.0, 'transporte', 'Uber'),
+            (30.0, 'alimentação', 'Jantar'),
+        ])
+        
+        food = ExpenseService.get_expenses_by_period(self.test_phone, 'today', 'alimentação')
+        self.assertEqual({expense.category for expense in food}, {'alimentação'})
+        self.assertEqual(len(food), 2)
+        
+        self.assertEqual(len(ExpenseService.get_expenses_by_period(self.test_phone, 'today', 'todas as categorias')), 3)
+        self.assertEqual(len(ExpenseService.get_expenses_by_period(self.test_phone, 'today', limit=1)), 1)
+    
+    def test_get_expenses_by_period_rows(self):
+        """Testa a listagem do período como linhas simples."""
+        for amount, category in [(10.0, 'alimentação'), (20.0, 'transporte')]:
+            ExpenseService.create_expense(self.test_phone, {'amount': amount, 'category': category})
+        
+        rows = ExpenseService.get_expenses_by_period_rows(self.test_phone, 'today')
+        self.assertEqual(len(rows), 2)
+        self.assertNotIsInstance(rows[0], Expense)
+        
+        rows = ExpenseService.get_expenses_by_period_rows(self.test_phone, 'today', 'transporte')
+        self.assertEqual([(r.amount, r.category) for r in rows], [(20.0, 'transporte')])
     
     def test_get_total_by_period(self):
         """Testa cálculo de total por período."""
         # Cria gastos
-        message_data1 = {
-            'amount': 30.0,
-            'category': 'alimentação',
-            'description': 'Gasto 1',
-            'confidence': 1.0,
-            'original_message': 'Gasto 1'
-        }
-        message_data2 = {
-            'amount': 20.0,
-            'category': 'transporte',
-            'description': 'Gasto 2',
-            'confidence': 1.0,
-            'original_message': 'Gasto 2'
-        }
-        
-        ExpenseService.create_expense(self.test_phone, message_data1)
-        ExpenseService.create_expense(self.test_phone, message_data2)
+        _seed_expenses(self.test_phone, [
+            (30.0, 'alimentação', 'Gasto 1'),
+            (20.0, 'transporte', 'Gasto 2')
+        ])
         
         total = ExpenseService.get_total_by_period(self.test_phone, 'all')
-        self.assertEqual(total, 50.0)
+        self.assertAlmostEqual(total, 50.0, places=6)
         
         # Testa filtro por categoria
         total_food = ExpenseService.get_total_by_period(self.test_phone, 'all', 'alimentação')
-        self.assertEqual(total_food, 30.0)
+        self.assertAlmostEqual(total_food, 30.0, places=6)
     
-    def test_get_category_summary(self):
-        """Testa resumo por categoria."""
-        # Cria gastos em diferentes categorias
-        categories_data = [
-            ('alimentação', 50.0),
-            ('alimentação', 30.0),
-            ('transporte', 20.0)
-        ]
+    def test_get_period_totals(self):
+        """Testa agregados (total, quantidade e média) do período."""
+        for amount in (30.0, 20.0, 10.0):
+            message_data = {
+                'amount': amount,
+                'category': 'alimentação',
+                'description': 'Teste',
+                'confidence': 1.0,
+                'original_message': 'Teste'
+            }
+            ExpenseService.create_expense(self.test_phone, message_data)
+        
+        totals = ExpenseService.get_period_totals(self.test_phone, 'all')
         
-        for category, amount in categories_data:
+        self.assertAlmostEqual(totals['total'], 60.0, places=6)
+        self.assertEqual(totals['count'], 3)
+        self.assertAlmostEqual(totals['average'], 20.0, places=6)
+        
+        # Usuário sem gastos
+        empty = ExpenseService.get_period_totals("5511000000000", 'all')
+        self.assertEqual(empty, {'total': 0.0, 'count': 0, 'average': 0.0})
+    
+    def test_get_daily_totals(self):
+        """Testa totais diários agregados no banco."""
+        for amount in (30.0, 20.0):
             message_data = {
                 'amount': amount,
-                'category': category,
+                'category': 'alimentação',
                 'description': 'Teste',
                 'confidence': 1.0,
                 'original_message': 'Teste'
             }
             ExpenseService.create_expense(self.test_phone, message_data)
         
+        daily_totals = ExpenseService.get_daily_totals(self.test_phone, 'all')
+        
+        self.assertEqual(len(daily_totals), 1)
+        day, total = daily_totals[0]
+        self.assertIsInstance(day, date)
+        self.assertAlmostEqual(total, 50.0, places=6)
+    
+    def test_get_category_summary(self):
+        """Testa resumo por categoria."""
+        # Cria gastos em diferentes categorias
+        _seed_expenses(self.test_phone, [
+            (50.0, 'alimentação', 'Teste'),
+            (30.0, 'alimentação', 'Teste'),
+            (20.0, 'transporte', 'Teste')
+        ])
+        
         summary = ExpenseService.get_category_summary(self.test_phone, 'all')
         
-        # Verifica se há 2 categorias
+        # Verifica se há 2 categorias, da maior para a menor
         self.assertEqual(len(summary), 2)
+        self.assertEqual(summary[0]['category'], 'alimentação')
         
         # Verifica totais
-        food_summary = next(item for item in summary if item['category'] == 'alimentação')
-        self.assertEqual(food_summary['total'], 80.0)
-        self.assertEqual(food_summary['count'], 2)
+        summary_by_category = {item['category']: item for item in summary}
+        self.assertAlmostEqual(summary_by_category['alimentação']['total'], 80.0, places=6)
+        self.assertEqual(summary_by_category['alimentação']['count'], 2)
+        self.assertAlmostEqual(summary_by_category['transporte']['total'], 20.0, places=6)
+        self.assertEqual(summary_by_category['transporte']['count'], 1)
+    
+    def test_period_aggregates_use_covering_index(self):
+        """Testa que os agregados por período são resolvidos só pelo índice."""
+        start_date, end_date = datetime(2024, 1, 1), datetime(2024, 12, 31)
+        stmt = (
+            select(Expense.category, db.func.sum(Expense.amount), db.func.count(1))
+            .where(
+                Expense.user_phone == self.test_phone,
+                Expense.created_at >= start_date,
+                Expense.created_at <= end_date,
+            )
+            .group_by(Expense.category)
+        )
+        sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        
+        plan = ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+        
+        self.assertIn('USING COVERING INDEX ix_expenses_user_', plan)
+    
+    def test_data_fingerprint_uses_covering_index(self):
+        """Testa que a impressão digital dos dados não precisa ler a tabela."""
+        start_date, end_date = datetime(2024, 1, 1), datetime(2024, 12, 31)
+        stmt = select(db.func.count(1), db.func.max(Expense.updated_at)).where(
+            Expense.user_phone == self.test_phone,
+            Expense.created_at >= start_date,
+            Expense.created_at <= end_date,
+        )
+        sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        
+        plan = ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
         
-        transport_summary = next(item for item in summary if item['category'] == 'transporte')
-        self.assertEqual(transport_summary['total'], 20.0)
-        self.assertEqual(transport_summary['count'], 1)
+        self.assertIn('USING COVERING INDEX ix_expenses_user_created', plan)
+    
+    def test_recent_first_order_comes_from_index(self):
+        """Testa que a ordem (created_at, id) decrescente não exige ordenação extra."""
+        stmt = (
+            select(Expense)
+            .where(Expense.user_phone == self.test_phone)
+            .order_by(Expense.created_at.desc(), Expense.id.desc())
+            .limit(100)
+        )
+        sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        
+        plan = ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+        
+        self.assertIn('ix_expenses_user_created', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
     
     def test_get_user_statistics(self):
         """Testa estatísticas do usuário."""
@@ -154,32 +355,32 @@ class TestExpenseService(unittest.TestCase):
         stats = ExpenseService.get_user_statistics(self.test_phone)
         
         self.assertEqual(stats['total_expenses'], 1)
-        self.assertEqual(stats['total_amount'], 100.0)
+        self.assertAlmostEqual(stats['total_amount'], 100.0, places=6)
         self.assertEqual(stats['most_used_category'], 'alimentação')
-
-class TestCategoryService(unittest.TestCase):
-    """Testes para CategoryService."""
     
-    def setUp(self):
-        """Configura o teste."""
-        self.app = Flask(__name__)
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-        self.app.config['TESTING'] = True
-        
-        db.init_app(self.app)
+    def test_statistics_cache_invalidated_on_change(self):
+        """Testa que o cache das estatísticas é invalidado ao criar e remover gastos."""
+        message_data = {
+            'amount': 40.0,
+            'category': 'lazer',
+            'description': 'Cinema',
+            'confidence': 1.0,
+            'original_message': 'Teste'
+        }
+        ExpenseService.create_expense(self.test_phone, message_data)
+        self.assertAlmostEqual(ExpenseService.get_user_statistics(self.test_phone)['total_amount'], 40.0, places=6)
+        self.assertAlmostEqual(ExpenseService.get_total_by_period(self.test_phone, 'all', 'lazer'), 40.0, places=6)
         
-        with self.app.app_context():
-            db.create_all()
+        expense = ExpenseService.create_expense(self.test_phone, message_data)
+        self.assertAlmostEqual(ExpenseService.get_user_statistics(self.test_phone)['total_amount'], 80.0, places=6)
+        self.assertAlmostEqual(ExpenseService.get_total_by_period(self.test_phone, 'all', 'lazer'), 80.0, places=6)
         
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-    
-    def tearDown(self):
-        """Limpa após o teste."""
-        db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
+        ExpenseService.delete_expense(expense.id, self.test_phone)
+        self.assertEqual(ExpenseService.get_user_statistics(self.test_phone)['total_expenses'], 1)
+        self.assertAlmostEqual(ExpenseService.get_category_summary(self.test_phone, 'all')[0]['total'], 40.0, places=6)
+
+class TestCategoryService(DatabaseTestCase):
+    """Testes para CategoryService."""
     
     def test_create_category(self):
         """Testa criação de categoria."""
@@ -200,16 +401,15 @@ class TestCategoryService(unittest.TestCase):
         CategoryService.initialize_default_categories()
         
         categories = CategoryService.get_all_categories()
-        category_names = [cat.name for cat in categories]
+        category_names = {cat.name for cat in categories}
         
         # Verifica se as categorias padrão foram criadas
-        expected_categories = [
+        expected_categories = frozenset({
             'alimentação', 'transporte', 'combustível', 'saúde',
             'educação', 'lazer', 'casa', 'roupas', 'outros'
-        ]
+        })
         
-        for expected in expected_categories:
-            self.assertIn(expected, category_names)
+        self.assertLessEqual(expected_categories, category_names)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,69 @@
+"""
+Testes para o webhook do WhatsApp.
+"""
+import unittest
+from unittest import mock
+
+from flask import Flask
+from src.whatsapp.webhook import webhook_bp
+
+class TestWebhook(unittest.TestCase):
+    """Testes para o endpoint POST /webhook."""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Cria um único app com o blueprint do webhook."""
+        app = Flask(__name__)
+        app.register_blueprint(webhook_bp, url_prefix='/api')
+        cls.app = app
+    
+    def setUp(self):
+        """Substitui o despacho das mensagens e o tratamento de status por mocks."""
+        self.client = self.app.test_client()
+        
+        submit = mock.patch('src.whatsapp.dispatcher.submit')
+        self.submit = submit.start()
+        self.addCleanup(submit.stop)
+        
+        handle_status = mock.patch('src.whatsapp.message_handler.MessageHandler.handle_message_status')
+        self.handle_status = handle_status.start()
+        self.addCleanup(handle_status.stop)
+    
+    def _post_value(self, value):
+        """Envia um payload com uma única alteração 'messages' contendo value."""
+        return self.client.post('/api/webhook', json={
+            'entry': [{'changes': [{'field': 'messages', 'value': value}]}]
+        })
+    
+    def test_malformed_messages_and_statuses_are_ignored(self):
+        """Testa que listas malformadas respondem 200 sem despachar nada."""
+        payloads = (
+            {'messages': {'a': 1}},
+            {'messages': ['x', 1, None]},
+            {'messages': 'texto'},
+            {'statuses': {'id': 's1'}},
+            {'statuses': ['x']},
+        )
+        
+        for value in payloads:
+            with self.subTest(value=value):
+                response = self._post_value(value)
+                self.assertEqual(response.status_code, 200)
+        
+        self.submit.assert_not_called()
+        self.handle_status.assert_not_called()
+    
+    def test_valid_items_are_dispatched_next_to_malformed_ones(self):
+        """Testa que os itens válidos de uma lista mista ainda são processados."""
+        message = {'id': 'm1', 'from': '5511999999999', 'type': 'text'}
+        status = {'id': 's1', 'status': 'read'}
+        value = {'messages': ['x', message], 'statuses': [status, 42]}
+        
+        response = self._post_value(value)
+        
+        self.assertEqual(response.status_code, 200)
+        self.submit.assert_called_once_with(message, value)
+        self.handle_status.assert_called_once_with(status)
+
+if __name__ == '__main__':
+    unittest.main()